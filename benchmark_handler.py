@@ -0,0 +1,321 @@
+"""
+Benchmark hors ligne du pipeline talking head
+=============================================
+Appelle handler() dans le processus (sans RunPod ni réseau) avec les
+fixtures du dépôt (medias/originale.png, audio de référence WAV), pour
+plusieurs longueurs de texte et modes (standard, pipeline, batch).
+
+Mesures par scénario: latence p50/p95, RTF (latence / durée audio),
+frames/s, RTF TTS et vidéo (spans de JobTimings) et pic de RSS du scénario.
+Comparaison optionnelle à une baseline JSON: toute dégradation au-delà
+de la tolérance est signalée (code de sortie 1).
+
+    python benchmark_handler.py                          # XTTS réel
+    python benchmark_handler.py --stub-tts               # chemin vidéo seul
+    python benchmark_handler.py --save-baseline benchmark_baseline.json
+    python benchmark_handler.py --baseline benchmark_baseline.json --tolerance 0.1
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+import handler
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_FIXTURE = os.path.join(ROOT_DIR, 'medias', 'originale.png')
+AUDIO_FIXTURE = os.path.join(ROOT_DIR, 'audio_coqui_20260129_125557.wav')
+
+TEXTS = {
+    'short': "Bonjour, bienvenue dans notre démonstration.",
+    'medium': (
+        "Bonjour et bienvenue. Aujourd'hui, nous allons vous présenter notre nouvelle "
+        "plateforme de génération de vidéos, qui transforme un simple texte en une "
+        "présentation animée et naturelle."
+    ),
+    'long': (
+        "Bonjour et bienvenue dans cette présentation. Notre plateforme transforme un "
+        "texte en une vidéo où une personne lit votre message avec une voix naturelle. "
+        "La synthèse vocale produit d'abord l'audio, puis le modèle de synchronisation "
+        "labiale anime le visage image par image. Chaque étape est mesurée afin de "
+        "suivre les performances du service. Les résultats peuvent être envoyés vers "
+        "un stockage objet ou retournés directement dans la réponse. Merci de votre "
+        "attention, et à très bientôt pour une nouvelle démonstration."
+    ),
+}
+MODES = ('standard', 'pipeline', 'batch')
+# Débit de parole de la voix simulée (caractères par seconde d'audio)
+STUB_CHARS_PER_SECOND = 15.
+
+
+def load_fixture_waveform(path=AUDIO_FIXTURE):
+    """Forme d'onde (float32 mono, sample_rate) du WAV de référence"""
+    with wave.open(path, 'rb') as f:
+        sample_rate = f.getframerate()
+        channels = f.getnchannels()
+        pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    wav = pcm.reshape(-1, channels).mean(axis=1) / 32768.
+    return wav.astype(np.float32), sample_rate
+
+
+def stub_tts():
+    """
+    Remplace XTTS par l'audio de référence, bouclé à la longueur du texte.
+    
+    Isole le chemin vidéo (mel, détection, Wav2Lip, encodage): la durée
+    audio reste proportionnelle au texte, sans charger le modèle TTS.
+    """
+    wav, sample_rate = load_fixture_waveform()
+    
+    def synthesize_waveform(text, language, speaker_kwargs, abort=None):
+        if abort is not None:
+            abort()
+        samples = max(1, int(len(text) / STUB_CHARS_PER_SECOND * sample_rate))
+        return np.resize(wav, samples), sample_rate
+    
+    handler.init_tts_model = lambda: None
+    handler.synthesize_waveform = synthesize_waveform
+    print(f"🎭 XTTS simulé: {AUDIO_FIXTURE} ({STUB_CHARS_PER_SECOND:g} caractères/s)")
+
+
+def build_event(text, mode, image_b64, index):
+    """Événement handler() pour un scénario (cache désactivé)"""
+    job_input = {'image': image_b64, 'language': 'fr', 'cache': False}
+    if mode == 'batch':
+        # Trois vidéos pour la même image
+        job_input['items'] = [{'text': text} for _ in range(3)]
+    else:
+        job_input['text'] = text
+        job_input['pipeline'] = mode == 'pipeline'
+    return {'id': f"bench-{mode}-{index}", 'input': job_input}
+
+
+def audio_seconds(result):
+    """Durée totale de l'audio retourné (WAV base64)"""
+    results = result.get('items') or [result]
+    total = 0.
+    for item in results:
+        if not item.get('audio_base64'):
+            continue
+        with wave.open(io.BytesIO(base64.b64decode(item['audio_base64'])), 'rb') as f:
+            total += f.getnframes() / f.getframerate()
+    return total
+
+
+def percentile(values, q):
+    """Percentile par interpolation linéaire"""
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def torch_cuda():
+    return handler.torch.cuda.is_available()
+
+
+class RssSampler:
+    """
+    Pic de RSS d'un scénario, échantillonné dans un thread.
+    
+    ru_maxrss (peak_rss_bytes) est le pic de tout le processus et ne se
+    remet pas à zéro: il dépendrait de l'ordre des scénarios.
+    """
+    
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, handler.current_rss_bytes())
+            self.stopped.wait(self.interval)
+    
+    def __enter__(self):
+        self.peak = handler.current_rss_bytes()
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, handler.current_rss_bytes())
+
+
+def run_scenario(text_name, mode, image_b64, repeat, warmup):
+    """Exécute un scénario et agrège ses mesures"""
+    text = TEXTS[text_name]
+    latencies, rtfs, fps, tts_rtfs, video_rtfs = [], [], [], [], []
+    backend = None
+    
+    if torch_cuda():
+        handler.torch.cuda.reset_peak_memory_stats()
+    
+    rss = RssSampler()
+    with rss:
+        for i in range(warmup + repeat):
+            start = time.perf_counter()
+            result = handler.handler(build_event(text, mode, image_b64, i))
+            latency = time.perf_counter() - start
+            if not result.get('success'):
+                raise RuntimeError(f"{text_name}/{mode}: {result.get('error')}")
+            if i < warmup:
+                continue
+            
+            duration = audio_seconds(result)
+            timings = result.get('timings', {})
+            latencies.append(latency)
+            rtfs.append(latency / duration)
+            fps.append(duration * handler.FPS / latency)
+            if 'rtf' in timings.get('tts', {}):
+                tts_rtfs.append(timings['tts']['rtf'])
+            if 'rtf' in timings.get('render', {}):
+                video_rtfs.append(timings['render']['rtf'])
+            backend = result.get('wav2lip_backend') or backend
+    
+    stats = {
+        'runs': repeat,
+        'audio_seconds': round(duration, 3),
+        'p50_seconds': round(percentile(latencies, 0.5), 4),
+        'p95_seconds': round(percentile(latencies, 0.95), 4),
+        'rtf': round(statistics.median(rtfs), 4),
+        'frames_per_second': round(statistics.median(fps), 2),
+        'tts_rtf': round(statistics.median(tts_rtfs), 4) if tts_rtfs else None,
+        'video_rtf': round(statistics.median(video_rtfs), 4) if video_rtfs else None,
+        'peak_rss_bytes': rss.peak,
+        'wav2lip_backend': backend,
+    }
+    if torch_cuda():
+        stats['peak_gpu_bytes'] = handler.torch.cuda.max_memory_allocated()
+    return stats
+
+
+def environment(stubbed):
+    """Contexte de la mesure (à comparer avant d'interpréter un écart)"""
+    return {
+        'device': handler.torch.cuda.get_device_name(0) if torch_cuda() else 'cpu',
+        'torch': handler.torch.__version__,
+        'wav2lip_backend': handler.WAV2LIP_BACKEND,
+        'batch_size': handler.get_batch_size(),
+        'stub_tts': stubbed,
+    }
+
+
+# Sens d'amélioration des métriques comparées à la baseline
+LOWER_IS_BETTER = ('p50_seconds', 'p95_seconds', 'rtf', 'tts_rtf', 'video_rtf', 'peak_rss_bytes')
+HIGHER_IS_BETTER = ('frames_per_second',)
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Compare les scénarios communs à la baseline.
+    
+    Returns:
+        list: Régressions (scénario, métrique, baseline, actuel)
+    """
+    if baseline.get('environment') != report['environment']:
+        print("⚠️  Environnement différent de la baseline:")
+        print(f"   baseline: {baseline.get('environment')}")
+        print(f"   actuel:   {report['environment']}")
+    
+    regressions = []
+    for name, stats in report['scenarios'].items():
+        reference = baseline.get('scenarios', {}).get(name)
+        if reference is None:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            before, after = reference.get(metric), stats.get(metric)
+            if not before or after is None:
+                continue
+            if metric in LOWER_IS_BETTER:
+                regressed = after > before * (1 + tolerance)
+            else:
+                regressed = after < before / (1 + tolerance)
+            if regressed:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def print_report(report):
+    print(f"\n{'scénario':<20} {'audio':>7} {'p50':>8} {'p95':>8} {'RTF':>7} {'fps':>8} "
+          f"{'RTF tts':>8} {'RTF vid':>8} {'RSS':>8}")
+    for name, stats in report['scenarios'].items():
+        tts_rtf = f"{stats['tts_rtf']:.3f}" if stats['tts_rtf'] is not None else '-'
+        video_rtf = f"{stats['video_rtf']:.3f}" if stats['video_rtf'] is not None else '-'
+        print(f"{name:<20} {stats['audio_seconds']:>6.1f}s {stats['p50_seconds']:>7.2f}s "
+              f"{stats['p95_seconds']:>7.2f}s {stats['rtf']:>7.3f} {stats['frames_per_second']:>8.1f} "
+              f"{tts_rtf:>8} {video_rtf:>8} {stats['peak_rss_bytes'] / 1024 ** 2:>6.0f}Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne de handler()")
+    parser.add_argument('--stub-tts', action='store_true', help="Remplacer XTTS par l'audio de référence")
+    parser.add_argument('--texts', default=','.join(TEXTS), help="Longueurs de texte (short,medium,long)")
+    parser.add_argument('--modes', default=','.join(MODES), help="Modes (standard,pipeline,batch)")
+    parser.add_argument('--repeat', type=int, default=5, help="Exécutions mesurées par scénario")
+    parser.add_argument('--warmup', type=int, default=1, help="Exécutions de chauffe non mesurées")
+    parser.add_argument('--output', help="Écrire le rapport JSON dans ce fichier")
+    parser.add_argument('--baseline', help="Baseline JSON à laquelle comparer")
+    parser.add_argument('--save-baseline', help="Enregistrer le rapport comme baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Dégradation tolérée (0.1 = 10%%)")
+    args = parser.parse_args()
+    
+    # Sorties en base64 dans la réponse, sans upload S3
+    handler.S3_BUCKET = None
+    if args.stub_tts:
+        stub_tts()
+    
+    with open(IMAGE_FIXTURE, 'rb') as f:
+        image_b64 = base64.b64encode(f.read()).decode()
+    
+    print("🚀 Benchmark hors ligne du pipeline talking head")
+    print("=" * 60)
+    if args.stub_tts:
+        handler.init_wav2lip_model()
+    else:
+        handler.warmup_models()
+    
+    report = {'environment': environment(args.stub_tts), 'scenarios': {}}
+    for text_name in args.texts.split(','):
+        for mode in args.modes.split(','):
+            name = f"{text_name}/{mode}"
+            print(f"\n⏱️  {name} ({args.warmup} chauffe + {args.repeat} mesures)")
+            report['scenarios'][name] = run_scenario(text_name, mode, image_b64, args.repeat, args.warmup)
+    
+    print_report(report)
+    
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Rapport écrit: {path}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} régression(s) au-delà de {args.tolerance:.0%}:")
+            for name, metric, before, after in regressions:
+                print(f"   {name} {metric}: {before} → {after}")
+            return 1
+        print(f"\n✅ Aucune régression au-delà de {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
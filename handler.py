@@ -6,13 +6,22 @@ Utilise Coqui TTS XTTS_v2 pour une qualité audio professionnelle.
 
 Input:
     - image: URL ou base64 de l'image de la personne
+    - video: (optionnel) URL ou base64 d'une vidéo pilote, à la place de l'image
     - text: Le texte à faire lire
-    - voice: (optionnel) Nom du speaker ou fichier audio pour clonage
+    - voice: (optionnel) Nom du speaker, voice_id ou fichier audio pour clonage
+    - operation: (optionnel) 'register_voice' pour enregistrer une voix clonée
     - language: (optionnel) Langue du texte (default: 'fr')
+    - pipeline: (optionnel) Synthèse XTTS et lip-sync en pipeline phrase par phrase
+    - cache: (optionnel) Réutiliser un résultat identique déjà calculé (default: True)
+    - items: (optionnel) Liste de {text, voice, language}: plusieurs vidéos pour la même image
+    - audio_format: (optionnel) Format de l'audio retourné: wav, pcm16, opus, mp3, aac (default: 'wav')
+    - sample_rate: (optionnel) Fréquence d'échantillonnage de l'audio retourné
 
 Output:
-    - audio_base64: Audio encodé en base64
-    - audio_size_bytes: Taille de l'audio
+    - video_url / audio_url: URLs présignées si S3_BUCKET est configuré
+    - video_base64: Sinon, vidéo MP4 (H.264 + audio AAC, faststart) encodée en base64
+    - audio_base64: Sinon, audio encodé en base64
+    - video_size_bytes / audio_size_bytes: Tailles des fichiers
 """
 
 import runpod
@@ -25,6 +34,10 @@ import json
 import torch
 import sys
 import subprocess
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
 
 print(f"🚀 Démarrage du worker RunPod")
 print(f"🐍 Python version: {sys.version}")
@@ -57,12 +70,434 @@ except Exception as e:
 # Initialisation globale des modèles (chargés une seule fois)
 TTS_MODEL = None
 WAV2LIP_MODEL = None
+FACE_DETECTOR = None
+TTS_INIT_LOCK = threading.Lock()
+WAV2LIP_INIT_LOCK = threading.Lock()
+FACE_DETECTOR_INIT_LOCK = threading.Lock()
+
+# Temps de démarrage à froid par composant (secondes)
+COLD_START_TIMINGS = {}
+
+# Jobs acceptés simultanément par le worker (concurrency_modifier RunPod)
+MAX_CONCURRENT_JOBS = max(1, int(os.environ.get('MAX_CONCURRENT_JOBS', '2')))
+# Handler générateur: événements de progression, audio et vidéo fragmentée
+STREAM_OUTPUT = os.environ.get('STREAM_OUTPUT', '0') == '1'
+
+
+class StageScheduler:
+    """
+    Sérialise l'accès aux modèles partagés entre jobs concurrents.
+    
+    Chaque étape ('tts', 'wav2lip') a une capacité (1 par défaut: un seul
+    appel modèle à la fois). Les jobs se relaient batch par batch, tandis que
+    téléchargement, détection, encodage et upload se chevauchent librement.
+    """
+    
+    def __init__(self, capacities):
+        self.semaphores = {name: threading.Semaphore(c) for name, c in capacities.items()}
+        self.stats = {name: {'calls': 0, 'wait_seconds': 0.0, 'busy_seconds': 0.0}
+                      for name in capacities}
+        self.lock = threading.Lock()
+    
+    @contextmanager
+    def stage(self, name):
+        import time
+        
+        semaphore = self.semaphores[name]
+        requested = time.perf_counter()
+        semaphore.acquire()
+        acquired = time.perf_counter()
+        try:
+            yield
+        finally:
+            semaphore.release()
+            released = time.perf_counter()
+            with self.lock:
+                stats = self.stats[name]
+                stats['calls'] += 1
+                stats['wait_seconds'] += acquired - requested
+                stats['busy_seconds'] += released - acquired
+    
+    def snapshot(self):
+        with self.lock:
+            return {name: {k: round(v, 3) if isinstance(v, float) else v for k, v in s.items()}
+                    for name, s in self.stats.items()}
+
+
+MODEL_SCHEDULER = StageScheduler({
+    'tts': int(os.environ.get('TTS_STAGE_CONCURRENCY', '1')),
+    'wav2lip': int(os.environ.get('WAV2LIP_STAGE_CONCURRENCY', '1')),
+})
+
+class JobTimings:
+    """
+    Spans de temps par étape d'un job: temps réel, temps CPU et tailles.
+    
+    Les spans de même nom s'additionnent (un span par batch Wav2Lip donne
+    un total et un nombre d'appels). Le temps CPU est celui du processus:
+    il inclut les threads auxiliaires et, en concurrence, les autres jobs.
+    Les spans de premier niveau sont loggés en une ligne JSON à leur fin.
+    """
+    
+    def __init__(self, job_id=None, log=True):
+        import time
+        
+        self.job_id = job_id
+        self.log = log
+        self.spans = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+    
+    @contextmanager
+    def span(self, name, log=True, **sizes):
+        """Mesure un bloc; le dict produit accepte des tailles (frames, bytes...)"""
+        import time
+        
+        fields = dict(sizes)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield fields
+        finally:
+            self.record(name, time.perf_counter() - wall_start, time.process_time() - cpu_start,
+                        log=log, **fields)
+    
+    def record(self, name, wall_seconds, cpu_seconds=0., log=False, **sizes):
+        """Ajoute une mesure au span `name` (tailles numériques additionnées)"""
+        with self.lock:
+            entry = self.spans.setdefault(name, {'wall_seconds': 0., 'cpu_seconds': 0., 'calls': 0})
+            entry['wall_seconds'] += wall_seconds
+            entry['cpu_seconds'] += cpu_seconds
+            entry['calls'] += 1
+            for key, value in sizes.items():
+                if isinstance(value, (int, float)) and isinstance(entry.get(key), (int, float)):
+                    entry[key] += value
+                else:
+                    entry[key] = value
+        
+        if self.log and log:
+            print(json.dumps({
+                'event': 'span',
+                'job_id': self.job_id,
+                'stage': name,
+                'wall_seconds': round(wall_seconds, 4),
+                'cpu_seconds': round(cpu_seconds, 4),
+                **sizes,
+            }))
+    
+    def value(self, name, key, default=0):
+        """Valeur cumulée `key` du span `name` (default si absent)"""
+        with self.lock:
+            return self.spans.get(name, {}).get(key, default)
+    
+    def to_dict(self):
+        """Spans arrondis, avec facteurs temps réel (RTF) et durée totale du job"""
+        import time
+        
+        with self.lock:
+            spans = {name: dict(entry) for name, entry in self.spans.items()}
+        
+        for entry in spans.values():
+            # RTF = temps de calcul / durée produite (< 1: plus rapide que le temps réel)
+            for key in ('audio_seconds', 'video_seconds'):
+                if entry.get(key):
+                    entry['rtf'] = entry['wall_seconds'] / entry[key]
+                    break
+            for key, value in entry.items():
+                if isinstance(value, float):
+                    entry[key] = round(value, 4)
+        
+        spans['total'] = {'wall_seconds': round(time.perf_counter() - self.started, 4)}
+        return spans
+    
+    def log_summary(self):
+        """Ligne JSON récapitulative du job"""
+        if self.log:
+            print(json.dumps({'event': 'job_timings', 'job_id': self.job_id, 'timings': self.to_dict()}))
+
+
+# Métriques du worker au format texte Prometheus (port HTTP local et/ou fichier)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+# Interface d'écoute: locale par défaut (0.0.0.0 pour un scraper hors du conteneur)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_FILE = os.environ.get('METRICS_FILE', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '15'))
+# Fenêtre glissante (secondes) des débits jobs/s et frames/s
+METRICS_WINDOW = float(os.environ.get('METRICS_WINDOW', '60'))
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 120., 300.)
+
+
+def current_rss_bytes():
+    """Mémoire résidente actuelle du processus (0 si indisponible)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def peak_rss_bytes():
+    """Pic de mémoire résidente du processus depuis son démarrage"""
+    import resource
+    
+    # ru_maxrss est en kio sous Linux, en octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class WorkerMetrics:
+    """
+    Métriques internes du worker, exportées au format texte Prometheus.
+    
+    Chaque job terminé alimente les histogrammes de latence par étape (à
+    partir des spans de JobTimings) et les compteurs de jobs, frames et
+    secondes audio/vidéo. L'état du worker (RSS, caches, temps de
+    chargement des modèles, ordonnanceur, disque) est lu à l'export.
+    """
+    
+    def __init__(self, buckets=METRICS_BUCKETS, window=METRICS_WINDOW):
+        import time
+        
+        self.buckets = tuple(buckets)
+        self.window = window
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.recent = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+    
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+    
+    def inc(self, name, value=1, **labels):
+        """Incrémente un compteur"""
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def set(self, name, value, **labels):
+        """Fixe une jauge"""
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+    
+    def observe(self, name, value, **labels):
+        """Ajoute une observation à un histogramme"""
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.setdefault(
+                key, {'buckets': [0] * len(self.buckets), 'sum': 0., 'count': 0}
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+    
+    def observe_job(self, timings, result=None):
+        """
+        Enregistre un job terminé.
+        
+        Args:
+            timings: JobTimings du job
+            result: Résultat retourné par handler() (statut success/error)
+        """
+        import time
+        
+        spans = timings.to_dict()
+        status = 'success' if isinstance(result, dict) and result.get('success') else 'error'
+        self.inc('talking_head_jobs_total', status=status)
+        self.observe('talking_head_job_seconds', spans['total']['wall_seconds'])
+        
+        frames = 0
+        for stage, entry in spans.items():
+            if stage == 'total':
+                continue
+            self.observe('talking_head_stage_seconds', entry['wall_seconds'], stage=stage)
+            self.inc('talking_head_stage_cpu_seconds_total', entry['cpu_seconds'], stage=stage)
+            if stage == 'tts' and entry.get('audio_seconds'):
+                self.inc('talking_head_tts_audio_seconds_total', entry['audio_seconds'])
+                self.inc('talking_head_tts_wall_seconds_total', entry['wall_seconds'])
+                self.set('talking_head_tts_rtf', entry['rtf'])
+            if stage == 'render' and entry.get('video_seconds'):
+                frames = entry.get('frames', 0)
+                self.inc('talking_head_video_seconds_total', entry['video_seconds'])
+                self.inc('talking_head_frames_total', frames)
+                self.set('talking_head_video_rtf', entry['rtf'])
+        
+        now = time.time()
+        with self.lock:
+            self.recent.append((now, frames))
+            self.recent = [(t, f) for t, f in self.recent if now - t <= self.window]
+    
+    def _worker_state(self):
+        """Jauges lues à l'export: (nom, labels, valeur)"""
+        import time
+        
+        now = time.time()
+        with self.lock:
+            recent = [(t, f) for t, f in self.recent if now - t <= self.window]
+        window = min(self.window, max(now - self.started, 1e-6))
+        
+        state = [
+            ('talking_head_uptime_seconds', {}, now - self.started),
+            ('talking_head_jobs_per_second', {}, len(recent) / window),
+            ('talking_head_frames_per_second', {}, sum(f for _, f in recent) / window),
+            ('talking_head_rss_bytes', {}, current_rss_bytes()),
+            ('talking_head_peak_rss_bytes', {}, peak_rss_bytes()),
+        ]
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            state.append(('talking_head_gpu_memory_allocated_bytes', {}, torch.cuda.memory_allocated()))
+            state.append(('talking_head_gpu_memory_peak_bytes', {}, torch.cuda.max_memory_allocated()))
+        
+        for phase, seconds in dict(COLD_START_TIMINGS).items():
+            state.append(('talking_head_model_load_seconds', {'phase': phase}, seconds))
+        
+        for cache, stats in (('result', dict(RESULT_CACHE_STATS)), ('voice', dict(VOICE_CACHE_STATS))):
+            lookups = sum(stats.values())
+            misses = stats.get('misses', 0)
+            for outcome, count in stats.items():
+                state.append(('talking_head_cache_lookups_total', {'cache': cache, 'outcome': outcome}, count))
+            state.append(('talking_head_cache_hit_ratio', {'cache': cache},
+                          (lookups - misses) / lookups if lookups else 0.))
+        
+        for stage, stats in MODEL_SCHEDULER.snapshot().items():
+            state.append(('talking_head_scheduler_calls_total', {'stage': stage}, stats['calls']))
+            state.append(('talking_head_scheduler_wait_seconds_total', {'stage': stage}, stats['wait_seconds']))
+            state.append(('talking_head_scheduler_busy_seconds_total', {'stage': stage}, stats['busy_seconds']))
+        
+        for key, value in workspace_disk_usage().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                state.append((f"talking_head_workspace_{key}", {}, value))
+        return state
+    
+    def render(self):
+        """Exposition texte Prometheus (version 0.0.4)"""
+        def labels_text(labels):
+            if not labels:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+        
+        lines = []
+        typed = set()
+        
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+        
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, dict(h, buckets=list(h['buckets']))) for key, h in self.histograms.items())
+        
+        for (name, labels), value in counters:
+            declare(name, 'counter')
+            lines.append(f"{name}{labels_text(labels)} {value}")
+        for (name, labels), value in gauges:
+            declare(name, 'gauge')
+            lines.append(f"{name}{labels_text(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            declare(name, 'histogram')
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                lines.append(f"{name}_bucket{labels_text(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{labels_text(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{labels_text(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{labels_text(labels)} {histogram['count']}")
+        for name, labels, value in self._worker_state():
+            declare(name, 'counter' if name.endswith('_total') else 'gauge')
+            lines.append(f"{name}{labels_text(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+    
+    def write(self, path):
+        """Écrit l'exposition dans un fichier (remplacement atomique)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+WORKER_METRICS = WorkerMetrics()
+
+
+def start_metrics_exporter(port=None, path=None, interval=None):
+    """
+    Expose WORKER_METRICS pour un scraper local.
+    
+    Args:
+        port: Port HTTP de /metrics (default: METRICS_PORT, 0 = désactivé)
+        path: Fichier réécrit périodiquement (default: METRICS_FILE, '' = désactivé)
+        interval: Période d'écriture du fichier en secondes (default: METRICS_FLUSH_INTERVAL)
+    
+    Returns:
+        ThreadingHTTPServer ou None si le port HTTP est désactivé
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    port = METRICS_PORT if port is None else port
+    path = METRICS_FILE if path is None else path
+    interval = METRICS_FLUSH_INTERVAL if interval is None else interval
+    
+    server = None
+    if port:
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = WORKER_METRICS.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        
+        server = ThreadingHTTPServer((METRICS_HOST, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        print(f"📊 Métriques: http://{METRICS_HOST}:{port}/metrics")
+    
+    if path:
+        import time
+        
+        def flush_loop():
+            while True:
+                try:
+                    WORKER_METRICS.write(path)
+                except Exception as e:
+                    print(f"   ⚠️  Écriture des métriques impossible: {e}")
+                time.sleep(interval)
+        
+        threading.Thread(target=flush_loop, name='metrics-file', daemon=True).start()
+        print(f"📊 Métriques écrites toutes les {interval:g}s dans {path}")
+    
+    return server
+
 
 def init_tts_model():
     """Initialise le modèle Coqui TTS XTTS_v2"""
+    if TTS_MODEL is not None:
+        return TTS_MODEL
+    
+    with TTS_INIT_LOCK:
+        if TTS_MODEL is None:
+            _load_tts_model()
+    
+    return TTS_MODEL
+
+
+def _load_tts_model():
+    """Charge XTTS_v2 (appelé sous TTS_INIT_LOCK)"""
     global TTS_MODEL
+    import time
     
     if TTS_MODEL is None:
+        start_time = time.time()
         print("\n🔄 Chargement du modèle Coqui TTS XTTS_v2...")
         from TTS.api import TTS
         
@@ -77,51 +512,365 @@ def init_tts_model():
             # Charger le modèle multilingue XTTS_v2
             print(f"   ⏳ Téléchargement/chargement du modèle (~2GB)...")
             TTS_MODEL = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
-            print("   ✅ Modèle chargé avec succès")
+            COLD_START_TIMINGS['tts_load'] = round(time.time() - start_time, 3)
+            print(f"   ✅ Modèle chargé avec succès ({COLD_START_TIMINGS['tts_load']}s)")
         except Exception as e:
             print(f"   ❌ ERREUR chargement modèle: {e}")
             import traceback
             traceback.print_exc()
             raise
+
+
+# Espaces de travail des jobs: tmpfs (/dev/shm) s'il est assez grand, sinon TEMP_DIR
+TEMP_DIR = os.environ.get('TEMP_DIR', tempfile.gettempdir())
+JOB_WORKSPACE_QUOTA_BYTES = int(os.environ.get('JOB_WORKSPACE_QUOTA_MB', '2048')) * 1024 * 1024
+
+
+def _select_workspace_root():
+    """Choisit la racine des espaces de travail (JOB_WORKSPACE_DIR, tmpfs ou TEMP_DIR)"""
+    if os.environ.get('JOB_WORKSPACE_DIR'):
+        return os.environ['JOB_WORKSPACE_DIR']
     
-    return TTS_MODEL
+    # tmpfs seulement s'il peut contenir tous les jobs concurrents à quota plein
+    try:
+        stats = os.statvfs('/dev/shm')
+        if (os.access('/dev/shm', os.W_OK)
+                and stats.f_bavail * stats.f_frsize >= JOB_WORKSPACE_QUOTA_BYTES * MAX_CONCURRENT_JOBS):
+            return '/dev/shm/talking-head-jobs'
+    except OSError:
+        pass
+    return os.path.join(TEMP_DIR, 'jobs')
+
+
+WORKSPACE_ROOT = _select_workspace_root()
+WORKSPACE_STATS = {'jobs': 0, 'active': 0, 'peak_bytes': 0, 'quota_exceeded': 0, 'orphans_swept': 0}
+WORKSPACE_LOCK = threading.Lock()
+
+
+class WorkspaceQuotaExceeded(RuntimeError):
+    """Le job a écrit plus que JOB_WORKSPACE_QUOTA_MB dans son espace de travail"""
+
+
+class JobWorkspace:
+    """
+    Espace de travail d'un job: tous ses fichiers temporaires y sont créés.
+    
+    S'utilise comme context manager: le répertoire est supprimé à la sortie,
+    y compris sur exception. Le nom commence par le PID du worker pour que
+    sweep_orphan_workspaces reconnaisse les restes d'un worker disparu.
+    """
+    
+    def __init__(self, job_id=None, quota_bytes=None):
+        import re
+        import uuid
+        
+        job_id = re.sub(r'[^A-Za-z0-9_-]', '_', str(job_id or 'local'))[:64]
+        self.path = os.path.join(WORKSPACE_ROOT, f"{os.getpid()}-job-{job_id}-{uuid.uuid4().hex[:8]}")
+        self.quota_bytes = quota_bytes or JOB_WORKSPACE_QUOTA_BYTES
+        self.peak_bytes = 0
+    
+    def __enter__(self):
+        os.makedirs(self.path)
+        with WORKSPACE_LOCK:
+            WORKSPACE_STATS['jobs'] += 1
+            WORKSPACE_STATS['active'] += 1
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        import shutil
+        
+        self.usage()
+        shutil.rmtree(self.path, ignore_errors=True)
+        with WORKSPACE_LOCK:
+            WORKSPACE_STATS['active'] -= 1
+            WORKSPACE_STATS['peak_bytes'] = max(WORKSPACE_STATS['peak_bytes'], self.peak_bytes)
+        return False
+    
+    def mkdtemp(self, prefix='tmp'):
+        """Crée un sous-répertoire temporaire dans l'espace du job"""
+        return tempfile.mkdtemp(prefix=f"{prefix}-", dir=self.path)
+    
+    def usage(self):
+        """Octets actuellement écrits dans l'espace (met à jour le pic)"""
+        total = 0
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    pass
+        self.peak_bytes = max(self.peak_bytes, total)
+        return total
+    
+    def remaining(self):
+        """Octets encore disponibles avant le quota"""
+        return max(0, self.quota_bytes - self.usage())
+    
+    def check_quota(self, stage):
+        """Lève WorkspaceQuotaExceeded si le quota est dépassé après `stage`"""
+        used = self.usage()
+        if used > self.quota_bytes:
+            with WORKSPACE_LOCK:
+                WORKSPACE_STATS['quota_exceeded'] += 1
+            raise WorkspaceQuotaExceeded(
+                f"Quota d'espace de travail dépassé après {stage}: {used} > {self.quota_bytes} octets"
+            )
+
+
+def make_temp_dir(workspace=None, prefix='tmp'):
+    """Répertoire temporaire dans l'espace du job, sinon directement sous WORKSPACE_ROOT"""
+    if workspace is not None:
+        return workspace.mkdtemp(prefix)
+    os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"{os.getpid()}-{prefix}-", dir=WORKSPACE_ROOT)
+
+
+def sweep_orphan_workspaces():
+    """
+    Supprime les espaces de travail laissés par un worker précédent (crash, OOM kill).
+    
+    Appelé au démarrage, avant d'accepter des jobs: seuls les répertoires
+    d'un autre processus encore vivant sont conservés.
+    
+    Returns:
+        int: Nombre d'entrées supprimées
+    """
+    import shutil
+    
+    if not os.path.isdir(WORKSPACE_ROOT):
+        return 0
+    
+    swept = 0
+    for name in os.listdir(WORKSPACE_ROOT):
+        pid = name.split('-', 1)[0]
+        if pid.isdigit() and int(pid) != os.getpid():
+            try:
+                os.kill(int(pid), 0)
+                continue  # worker vivant (autre processus sur la même racine)
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue
+        entry = os.path.join(WORKSPACE_ROOT, name)
+        if os.path.isdir(entry) and not os.path.islink(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+        swept += 1
+    
+    with WORKSPACE_LOCK:
+        WORKSPACE_STATS['orphans_swept'] += swept
+    if swept:
+        print(f"🧹 {swept} espace(s) de travail orphelin(s) supprimé(s) dans {WORKSPACE_ROOT}")
+    return swept
+
+
+def workspace_disk_usage():
+    """Occupation du disque des espaces de travail (pour les métriques)"""
+    import shutil
+    
+    os.makedirs(WORKSPACE_ROOT, exist_ok=True)
+    disk = shutil.disk_usage(WORKSPACE_ROOT)
+    with WORKSPACE_LOCK:
+        stats = dict(WORKSPACE_STATS)
+    return {
+        'root': WORKSPACE_ROOT,
+        'tmpfs': WORKSPACE_ROOT.startswith('/dev/shm'),
+        'disk_total_bytes': disk.total,
+        'disk_free_bytes': disk.free,
+        **stats,
+    }
+
+
+# Téléchargement des entrées: session partagée (keep-alive), retries, timeouts, taille bornée
+FETCH_CONNECT_TIMEOUT = float(os.environ.get('FETCH_CONNECT_TIMEOUT', '5'))
+FETCH_READ_TIMEOUT = float(os.environ.get('FETCH_READ_TIMEOUT', '30'))
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', '3'))
+FETCH_BACKOFF = float(os.environ.get('FETCH_BACKOFF', '0.5'))
+FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_MB', '100')) * 1024 * 1024
+HTTP_SESSION = None
+HTTP_SESSION_LOCK = threading.Lock()
+
+
+def get_http_session():
+    """Session requests partagée: pool de connexions et retries avec backoff"""
+    global HTTP_SESSION
+    
+    if HTTP_SESSION is not None:
+        return HTTP_SESSION
+    
+    with HTTP_SESSION_LOCK:
+        if HTTP_SESSION is None:
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            
+            retry = Retry(
+                total=FETCH_RETRIES,
+                connect=FETCH_RETRIES,
+                read=FETCH_RETRIES,
+                backoff_factor=FETCH_BACKOFF,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=('GET', 'HEAD'),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(8, 4 * MAX_CONCURRENT_JOBS),
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            HTTP_SESSION = session
+    
+    return HTTP_SESSION
+
+
+def fetch_url(url, dest_path=None, max_bytes=None):
+    """
+    Télécharge une URL en streaming, sans dépasser max_bytes.
+    
+    Args:
+        url: URL http(s)
+        dest_path: (optionnel) Fichier de destination; sinon le contenu est retourné
+        max_bytes: Taille maximale acceptée (default: FETCH_MAX_BYTES)
+    
+    Returns:
+        bytes ou int: Contenu (sans dest_path) ou nombre d'octets écrits
+    """
+    max_bytes = max_bytes or FETCH_MAX_BYTES
+    timeout = (FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT)
+    
+    with get_http_session().get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ValueError(f"Fichier trop volumineux ({int(declared)} > {max_bytes} octets): {url}")
+        
+        received = 0
+        chunks = [] if dest_path is None else None
+        with (open(dest_path, 'wb') if dest_path else nullcontext()) as f:
+            for block in response.iter_content(chunk_size=256 * 1024):
+                received += len(block)
+                if received > max_bytes:
+                    raise ValueError(f"Fichier trop volumineux (> {max_bytes} octets): {url}")
+                if f is not None:
+                    f.write(block)
+                else:
+                    chunks.append(block)
+    
+    return received if dest_path else b''.join(chunks)
+
 
+def fetch_inputs(fetch_media, voices=()):
+    """
+    Télécharge le média d'entrée et les voix de référence distantes en parallèle.
+    
+    Args:
+        fetch_media: Fonction sans argument retournant (chemin, répertoire temporaire)
+        voices: Voix demandées; les URLs sont téléchargées et enregistrées
+    
+    Returns:
+        tuple: ((chemin, répertoire temporaire), {URL de voix: voice_id})
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    remote = sorted({v for v in voices if isinstance(v, str) and v.startswith(('http://', 'https://'))})
+    
+    with ThreadPoolExecutor(max_workers=1 + len(remote)) as pool:
+        media_future = pool.submit(fetch_media)
+        voice_futures = {v: pool.submit(register_voice, v) for v in remote}
+        media = media_future.result()
+        
+        voice_ids = {}
+        for voice, future in voice_futures.items():
+            try:
+                voice_ids[voice] = future.result()
+            except Exception as e:
+                # Le TTS retentera puis retombera sur le speaker par défaut
+                print(f"   ⚠️  Voix de référence indisponible ({voice}): {e}")
+    
+    return media, voice_ids
 
-def download_image(image_input):
+
+def download_image(image_input, workspace=None):
     """
     Télécharge ou décode l'image d'entrée.
     
     Args:
         image_input: URL ou base64 de l'image
+        workspace: (optionnel) JobWorkspace du job
     
     Returns:
         str: Chemin vers le fichier image temporaire
     """
-    temp_dir = tempfile.mkdtemp()
-    image_path = os.path.join(temp_dir, "input_image.jpg")
+    return download_media(image_input, "input_image.jpg", workspace)
+
+
+def download_video(video_input, workspace=None):
+    """
+    Télécharge ou décode la vidéo d'entrée (mode vidéo pilote).
     
-    if image_input.startswith('http://') or image_input.startswith('https://'):
-        # Télécharger depuis URL
-        response = requests.get(image_input)
-        response.raise_for_status()
-        with open(image_path, 'wb') as f:
-            f.write(response.content)
-    elif image_input.startswith('data:image'):
+    Args:
+        video_input: URL ou base64 de la vidéo
+        workspace: (optionnel) JobWorkspace du job
+    
+    Returns:
+        str: Chemin vers le fichier vidéo temporaire
+    """
+    return download_media(video_input, "input_video.mp4", workspace)
+
+
+def download_media(media_input, filename, workspace=None):
+    """
+    Télécharge ou décode un média d'entrée (URL, data URI ou base64).
+    
+    Args:
+        media_input: URL ou base64 du média
+        filename: Nom du fichier temporaire
+        workspace: (optionnel) JobWorkspace du job (quota appliqué au téléchargement)
+    
+    Returns:
+        tuple: (chemin du fichier, répertoire temporaire)
+    """
+    temp_dir = make_temp_dir(workspace, 'input')
+    media_path = os.path.join(temp_dir, filename)
+    
+    if media_input.startswith('http://') or media_input.startswith('https://'):
+        # Télécharger depuis URL (streaming, taille bornée)
+        max_bytes = FETCH_MAX_BYTES
+        if workspace is not None:
+            max_bytes = max(1, min(max_bytes, workspace.remaining()))
+        try:
+            fetch_url(media_input, media_path, max_bytes)
+        except Exception:
+            import shutil
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+    elif media_input.startswith('data:'):
         # Décoder base64
-        header, encoded = image_input.split(',', 1)
-        image_data = base64.b64decode(encoded)
-        with open(image_path, 'wb') as f:
-            f.write(image_data)
+        header, encoded = media_input.split(',', 1)
+        media_data = base64.b64decode(encoded)
+        with open(media_path, 'wb') as f:
+            f.write(media_data)
     else:
         # Assumer que c'est du base64 sans header
-        image_data = base64.b64decode(image_input)
-        with open(image_path, 'wb') as f:
-            f.write(image_data)
+        media_data = base64.b64decode(media_input)
+        with open(media_path, 'wb') as f:
+            f.write(media_data)
     
-    return image_path, temp_dir
+    if workspace is not None:
+        workspace.check_quota('download')
+    return media_path, temp_dir
+
 
+class JobAborted(Exception):
+    """Job interrompu avant la synthèse: une étape parallèle a invalidé l'entrée"""
 
-def text_to_speech(text, language='fr', voice='Claribel Dervla'):
+
+def text_to_speech(text, language='fr', voice='Claribel Dervla', abort=None, workspace=None):
     """
     Convertit le texte en audio avec Coqui TTS XTTS_v2.
     
@@ -159,153 +908,1985 @@ def text_to_speech(text, language='fr', voice='Claribel Dervla'):
     
     Clonage de voix:
     - Passez l'URL ou le chemin d'un fichier audio de 3-10 secondes
+    - Ou un voice_id obtenu avec l'opération 'register_voice' (latents en cache)
     
     Args:
         text: Le texte à synthétiser
         language: Code langue (fr, en, es, de, it, pt, pl, tr, ru, nl, cs, ar, zh-cn, ja, hu, ko, hi)
         voice: Nom du speaker ou URL/chemin audio pour clonage
+        abort: (optionnel) Fonction appelée avant chaque appel au modèle, lève
+            JobAborted pour interrompre la synthèse (voir face_abort_check)
+        workspace: (optionnel) JobWorkspace du job
     
     Returns:
-        tuple: (audio_path, temp_dir)
+        tuple: (audio_path, temp_dir, waveform, voice_used) avec waveform = (wav float32, sample_rate)
+            et voice_used la voix réellement synthétisée (speaker par défaut si repli)
     """
-    temp_dir = tempfile.mkdtemp()
+    temp_dir = make_temp_dir(workspace, 'tts')
     audio_path = os.path.join(temp_dir, "speech.wav")
     
     # Initialiser le modèle
-    tts = init_tts_model()
+    init_tts_model()
     
     print(f"   🎤 Synthèse Coqui TTS: langue={language}, speaker={voice}")
+    voice_used = voice
     
     try:
-        # Vérifier si c'est un clonage de voix (URL ou fichier)
-        if voice.startswith('http://') or voice.startswith('https://') or os.path.isfile(voice):
-            print(f"   🎭 Clonage de voix depuis: {voice}")
-            # Télécharger l'audio de référence si c'est une URL
-            if voice.startswith('http'):
-                ref_audio = os.path.join(temp_dir, "reference_voice.wav")
-                response = requests.get(voice)
-                with open(ref_audio, 'wb') as f:
-                    f.write(response.content)
-                voice = ref_audio
-            
-            # Générer avec clonage
-            tts.tts_to_file(
-                text=text,
-                speaker_wav=voice,
-                language=language,
-                file_path=audio_path
-            )
-        else:
-            # Utiliser un speaker par défaut
-            tts.tts_to_file(
-                text=text,
-                speaker=voice,
-                language=language,
-                file_path=audio_path
-            )
-        
-        print(f"   ✓ Audio généré: {audio_path}")
-        return audio_path, temp_dir
-        
-    except Exception as e:
-        print(f"   ⚠️  Erreur TTS: {e}")
-        # Fallback sur un speaker par défaut
-        print(f"   🔄 Tentative avec speaker par défaut...")
-        tts.tts_to_file(
-            text=text,
-            speaker="Claribel Dervla",
-            language=language,
-            file_path=audio_path
-        )
-        return audio_path, temp_dir
-
-
-def init_wav2lip_model():
-    """Initialise le modèle Wav2Lip pour génération vidéo"""
-    global WAV2LIP_MODEL
-    
-    if WAV2LIP_MODEL is None:
-        print("\n🎬 Chargement du modèle Wav2Lip...")
-        import sys
-        sys.path.append('/app/Wav2Lip')
-        
         try:
-            from models import Wav2Lip as Wav2LipModel
-            
-            checkpoint_path = '/app/Wav2Lip/checkpoints/wav2lip_gan.pth'
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            print(f"   📱 Device: {device}")
-            
-            # Télécharger le modèle s'il n'existe pas
-            if not os.path.exists(checkpoint_path):
-                print(f"   📥 Téléchargement du modèle Wav2Lip (~416 MB)...")
-                import urllib.request
-                # URL validée depuis Hugging Face (testée en local)
-                model_url = 'https://huggingface.co/camenduru/Wav2Lip/resolve/main/checkpoints/wav2lip_gan.pth'
-                try:
-                    urllib.request.urlretrieve(model_url, checkpoint_path)
-                    print(f"   ✅ Modèle téléchargé depuis Hugging Face")
-                except Exception as e:
-                    print(f"   ❌ Échec téléchargement: {e}")
-                    raise Exception(f"Impossible de télécharger le modèle Wav2Lip: {e}")
-            
-            # Charger le modèle
-            print(f"   ⏳ Chargement du checkpoint Wav2Lip...")
-            model = Wav2LipModel()
-            checkpoint = torch.load(checkpoint_path, map_location=device)
-            
-            # Charger les poids du modèle
-            s = checkpoint["state_dict"]
-            new_s = {}
-            for k, v in s.items():
-                new_s[k.replace('module.', '')] = v
-            model.load_state_dict(new_s)
-            
-            model = model.to(device)
-            model.eval()
-            
-            # Initialiser MediaPipe Face Detection (compatible MediaPipe 0.10+)
-            from mediapipe.python.solutions import face_detection as mp_face_detection
-            face_detector = mp_face_detection.FaceDetection(
-                min_detection_confidence=0.5,
-                model_selection=0  # 0 pour courte distance (< 2m)
-            )
+            speaker_kwargs = resolve_speaker_kwargs(voice, temp_dir)
+            waveform = synthesize_waveform(text, language, speaker_kwargs, abort)
             
-            WAV2LIP_MODEL = {'model': model, 'device': device, 'face_detector': face_detector}
-            print("   ✅ Modèle Wav2Lip chargé avec succès")
-            
-        except Exception as e:
-            print(f"   ❌ ERREUR chargement Wav2Lip: {e}")
-            import traceback
-            traceback.print_exc()
+        except (JobAborted, UnknownVoiceError):
             raise
+        except Exception as e:
+            print(f"   ⚠️  Erreur TTS: {e}")
+            # Fallback sur un speaker par défaut (signalé à l'appelant: voix différente)
+            print(f"   🔄 Tentative avec speaker par défaut...")
+            voice_used = "Claribel Dervla"
+            waveform = synthesize_waveform(text, language, {'speaker': voice_used}, abort)
+    except JobAborted:
+        import shutil
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
     
-    return WAV2LIP_MODEL
+    # Le WAV n'est écrit qu'une fois, pour la réponse; les traitements utilisent la forme d'onde
+    write_wav(audio_path, waveform)
+    print(f"   ✓ Audio généré: {audio_path}")
+    return audio_path, temp_dir, waveform, voice_used
 
 
-def generate_talking_head(image_path, audio_path, output_path):
+def write_wav(audio_path, waveform):
     """
-    Génère la vidéo talking head avec Wav2Lip.
+    Écrit une forme d'onde en mémoire dans un fichier WAV (PCM 16 bits).
     
     Args:
-        image_path: Chemin vers l'image
-        audio_path: Chemin vers l'audio
-        output_path: Chemin de sortie pour la vidéo
-    
-    Returns:
-        str: Chemin vers la vidéo générée
+        audio_path: Chemin de sortie
+        waveform: (wav float32, sample_rate)
     """
-    import sys
-    sys.path.append('/app/Wav2Lip')
+    import soundfile as sf
     
-    import cv2
-    import numpy as np
-    from os import path
-    import audio as wav2lip_audio
-    import mediapipe as mp
-    import torch
+    wav, sample_rate = waveform
+    sf.write(audio_path, wav, sample_rate, subtype='PCM_16')
+
+
+@lru_cache(maxsize=8)
+def _polyphase_filter(up, down):
+    """Filtre FIR anti-repliement de resample_poly, calculé une fois par ratio"""
+    from scipy.signal import firwin
     
-    print("   🎬 Initialisation Wav2Lip...")
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    return firwin(2 * half_len + 1, 1. / max_rate, window=('kaiser', 5.0))
+
+
+def resample_audio(wav, orig_sr, target_sr=16000):
+    """
+    Rééchantillonne une forme d'onde en mémoire (polyphase, filtre en cache).
+    
+    Args:
+        wav: Forme d'onde float32
+        orig_sr: Fréquence d'origine (24000 pour XTTS)
+        target_sr: Fréquence cible (16000 pour Wav2Lip)
+    
+    Returns:
+        ndarray: Forme d'onde float32 à target_sr
+    """
+    import math
+    import numpy as np
+    from scipy.signal import resample_poly
+    
+    if orig_sr == target_sr:
+        return wav
+    
+    g = math.gcd(orig_sr, target_sr)
+    up, down = target_sr // g, orig_sr // g
+    resampled = resample_poly(wav, up, down, window=_polyphase_filter(up, down))
+    
+    return resampled.astype(np.float32, copy=False)
+
+
+# Formats audio retournés: extension, type MIME, débit des formats compressés
+AUDIO_FORMATS = {
+    'wav': ('.wav', 'audio/wav'),
+    'pcm16': ('.pcm', 'audio/L16'),
+    'opus': ('.ogg', 'audio/ogg'),
+    'mp3': ('.mp3', 'audio/mpeg'),
+    'aac': ('.m4a', 'audio/mp4'),
+}
+AUDIO_OUTPUT_BITRATES = {
+    'opus': os.environ.get('AUDIO_OPUS_BITRATE', '32k'),
+    'mp3': os.environ.get('AUDIO_MP3_BITRATE', '64k'),
+    'aac': os.environ.get('AUDIO_AAC_BITRATE', '64k'),
+}
+# Encodeurs ffmpeg: (codec, conteneur, options)
+AUDIO_FFMPEG_CODECS = {
+    'opus': ('libopus', 'ogg', []),
+    'mp3': ('libmp3lame', 'mp3', []),
+    'aac': ('aac', 'ipod', ['-movflags', '+faststart']),
+}
+
+
+def parse_audio_options(job_input):
+    """
+    Lit les options audio_format et sample_rate d'un job.
+    
+    Returns:
+        dict ou None: {'format', 'sample_rate'}, None pour le WAV XTTS d'origine
+    """
+    audio_format = str(job_input.get('audio_format', 'wav')).lower()
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"audio_format inconnu: {audio_format} (attendu: {', '.join(AUDIO_FORMATS)})")
+    
+    sample_rate = job_input.get('sample_rate')
+    if sample_rate is not None:
+        sample_rate = int(sample_rate)
+        if not 8000 <= sample_rate <= 48000:
+            raise ValueError(f"sample_rate hors limites: {sample_rate} (8000-48000)")
+    
+    if audio_format == 'wav' and sample_rate is None:
+        return None
+    return {'format': audio_format, 'sample_rate': sample_rate}
+
+
+def _soundfile_supports(audio_format):
+    """libsndfile >= 1.1 encode Opus (OGG) et MP3 sans processus externe"""
+    import soundfile as sf
+    
+    if audio_format == 'opus':
+        return 'OPUS' in sf.available_subtypes('OGG')
+    if audio_format == 'mp3':
+        return 'MP3' in sf.available_formats()
+    return False
+
+
+def encode_audio(waveform, output_path, audio_format, sample_rate=None):
+    """
+    Encode une forme d'onde en mémoire dans le format audio demandé.
+    
+    WAV, PCM brut, Opus et MP3 sont encodés dans le processus (soundfile),
+    AAC et les codecs absents de libsndfile via un pipe ffmpeg.
+    
+    Args:
+        waveform: (wav float32, sample_rate)
+        output_path: Fichier de sortie
+        audio_format: Clé de AUDIO_FORMATS
+        sample_rate: (optionnel) Fréquence de sortie
+    
+    Returns:
+        int: Fréquence d'échantillonnage du fichier produit
+    """
+    import numpy as np
+    import soundfile as sf
+    
+    wav, orig_sr = waveform
+    target_sr = sample_rate or orig_sr
+    if audio_format == 'opus' and target_sr not in (8000, 12000, 16000, 24000, 48000):
+        # Fréquences supportées par Opus
+        target_sr = 48000
+    wav = np.clip(resample_audio(wav, orig_sr, target_sr), -1., 1.)
+    
+    if audio_format == 'wav':
+        write_wav(output_path, (wav, target_sr))
+    elif audio_format == 'pcm16':
+        # PCM 16 bits little-endian mono, sans en-tête
+        (wav * 32767.).astype('<i2').tofile(output_path)
+    elif _soundfile_supports(audio_format):
+        if audio_format == 'opus':
+            sf.write(output_path, wav, target_sr, format='OGG', subtype='OPUS')
+        else:
+            sf.write(output_path, wav, target_sr, format='MP3', subtype='MPEG_LAYER_III')
+    else:
+        codec, container, extra = AUDIO_FFMPEG_CODECS[audio_format]
+        cmd = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'f32le', '-ar', str(target_sr), '-ac', '1', '-i', 'pipe:0',
+            '-c:a', codec, '-b:a', AUDIO_OUTPUT_BITRATES[audio_format],
+            *extra, '-f', container, output_path,
+        ]
+        result = subprocess.run(cmd, input=np.ascontiguousarray(wav, dtype=np.float32).tobytes(),
+                                capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Encodage {audio_format} échoué: {result.stderr.decode(errors='replace').strip()}")
+    
+    return target_sr
+
+
+class UnknownVoiceError(ValueError):
+    """voice_id non enregistré: erreur explicite plutôt qu'une synthèse avec une autre voix"""
+
+
+def resolve_speaker_kwargs(voice, temp_dir):
+    """
+    Détermine les arguments speaker à passer à XTTS.
+    
+    Les voix clonées (URL ou fichier) passent par le registre de voix:
+    les latents de conditionnement sont calculés une seule fois par
+    contenu audio puis réutilisés.
+    
+    Args:
+        voice: Nom du speaker, voice_id enregistré ou URL/chemin audio pour clonage
+        temp_dir: Répertoire de travail temporaire
+    
+    Returns:
+        dict: {'speaker': ...} ou {'voice_id': ...}
+    
+    Raises:
+        UnknownVoiceError: voice_id absent du registre
+    """
+    # Voix déjà enregistrée: ni téléchargement ni calcul de latents
+    if voice.startswith(VOICE_ID_PREFIX):
+        if get_voice_latents(voice) is None:
+            raise UnknownVoiceError(
+                f"voice_id inconnu: {voice} (à enregistrer avec l'opération 'register_voice')"
+            )
+        print(f"   🎭 Voix enregistrée: {voice}")
+        return {'voice_id': voice}
+    
+    # Vérifier si c'est un clonage de voix (URL ou fichier)
+    if voice.startswith('http://') or voice.startswith('https://') or os.path.isfile(voice):
+        print(f"   🎭 Clonage de voix depuis: {voice}")
+        return {'voice_id': register_voice(voice, temp_dir)}
+    
+    # Utiliser un speaker par défaut
+    return {'speaker': voice}
+
+
+# Stockage local des modèles (volume réseau si disponible)
+MODEL_STORE_DIR = os.environ.get(
+    'MODEL_STORE_DIR',
+    '/runpod-volume/models' if os.path.isdir('/runpod-volume') else '/app/models'
+)
+# XTTS est téléchargé par Coqui TTS dans TTS_HOME: le placer dans le store
+# (chargement complet par TTS(...), pas de mémoire mappée pour XTTS)
+os.environ.setdefault('TTS_HOME', os.path.join(MODEL_STORE_DIR, 'tts'))
+
+# Registre des voix clonées (latents XTTS en cache mémoire LRU + disque)
+VOICE_ID_PREFIX = 'voice_'
+# Dans le store (volume réseau): un voice_id enregistré sur un worker sert à toute la flotte
+VOICE_CACHE_DIR = os.environ.get('VOICE_CACHE_DIR', os.path.join(MODEL_STORE_DIR, 'voices'))
+VOICE_CACHE_SIZE = int(os.environ.get('VOICE_CACHE_SIZE', '32'))
+# Taille maximale d'un audio de référence téléchargé (quelques secondes suffisent)
+VOICE_MAX_BYTES = int(os.environ.get('VOICE_MAX_MB', '20')) * 1024 * 1024
+
+VOICE_LATENTS = OrderedDict()
+VOICE_LATENTS_LOCK = threading.Lock()
+VOICE_CACHE_STATS = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+
+def read_voice_reference(voice):
+    """
+    Lit l'audio de référence d'une voix à cloner.
+    
+    Args:
+        voice: URL, chemin de fichier, data URI ou base64 de l'audio
+    
+    Returns:
+        bytes: Contenu du fichier audio
+    """
+    if voice.startswith('http://') or voice.startswith('https://'):
+        return fetch_url(voice, max_bytes=VOICE_MAX_BYTES)
+    if os.path.isfile(voice):
+        with open(voice, 'rb') as f:
+            return f.read()
+    if voice.startswith('data:'):
+        header, encoded = voice.split(',', 1)
+        return base64.b64decode(encoded)
+    return base64.b64decode(voice)
+
+
+def _voice_cache_path(voice_id):
+    return os.path.join(VOICE_CACHE_DIR, f"{voice_id}.pt")
+
+
+def _remember_voice(voice_id, latents):
+    """Ajoute les latents au cache mémoire (éviction LRU)"""
+    with VOICE_LATENTS_LOCK:
+        VOICE_LATENTS[voice_id] = latents
+        VOICE_LATENTS.move_to_end(voice_id)
+        while len(VOICE_LATENTS) > VOICE_CACHE_SIZE:
+            VOICE_LATENTS.popitem(last=False)
+
+
+def get_voice_latents(voice_id):
+    """
+    Retourne les latents d'une voix enregistrée (mémoire puis disque).
+    
+    Args:
+        voice_id: Identifiant retourné par register_voice
+    
+    Returns:
+        dict: {'gpt_cond_latent', 'speaker_embedding'} ou None si inconnue
+    """
+    with VOICE_LATENTS_LOCK:
+        if voice_id in VOICE_LATENTS:
+            VOICE_LATENTS.move_to_end(voice_id)
+            VOICE_CACHE_STATS['memory_hits'] += 1
+            return VOICE_LATENTS[voice_id]
+    
+    cache_path = _voice_cache_path(voice_id)
+    if not os.path.isfile(cache_path):
+        with VOICE_LATENTS_LOCK:
+            VOICE_CACHE_STATS['misses'] += 1
+        return None
+    
+    latents = torch.load(cache_path, map_location='cpu')
+    _remember_voice(voice_id, latents)
+    with VOICE_LATENTS_LOCK:
+        VOICE_CACHE_STATS['disk_hits'] += 1
+    return latents
+
+
+def register_voice(voice, temp_dir=None):
+    """
+    Enregistre une voix clonée et retourne son voice_id.
+    
+    Le voice_id est un hash du contenu audio: une même référence n'est
+    traitée qu'une fois. Les latents GPT et l'embedding speaker XTTS sont
+    persistés dans VOICE_CACHE_DIR.
+    
+    Args:
+        voice: URL, chemin, data URI ou base64 de l'audio de référence (3-10 s)
+        temp_dir: Répertoire de travail temporaire (optionnel)
+    
+    Returns:
+        str: voice_id
+    """
+    import hashlib
+    
+    audio_bytes = read_voice_reference(voice)
+    voice_id = VOICE_ID_PREFIX + hashlib.sha256(audio_bytes).hexdigest()[:32]
+    
+    if get_voice_latents(voice_id) is not None:
+        print(f"   ♻️  Voix déjà enregistrée: {voice_id}")
+        return voice_id
+    
+    print(f"   🧬 Calcul des latents de conditionnement: {voice_id}")
+    work_dir = temp_dir or make_temp_dir(prefix='voice')
+    ref_audio = os.path.join(work_dir, "reference_voice.wav")
+    with open(ref_audio, 'wb') as f:
+        f.write(audio_bytes)
+    
+    try:
+        xtts = init_tts_model().synthesizer.tts_model
+        with MODEL_SCHEDULER.stage('tts'):
+            gpt_cond_latent, speaker_embedding = xtts.get_conditioning_latents(audio_path=[ref_audio])
+    finally:
+        if temp_dir is None:
+            import shutil
+            shutil.rmtree(work_dir, ignore_errors=True)
+        else:
+            os.remove(ref_audio)
+    
+    latents = {
+        'gpt_cond_latent': gpt_cond_latent.cpu(),
+        'speaker_embedding': speaker_embedding.cpu(),
+    }
+    
+    # Écriture atomique sur disque
+    os.makedirs(VOICE_CACHE_DIR, exist_ok=True)
+    cache_path = _voice_cache_path(voice_id)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    torch.save(latents, tmp_path)
+    os.replace(tmp_path, cache_path)
+    
+    _remember_voice(voice_id, latents)
+    print(f"   ✓ Voix enregistrée: {voice_id}")
+    return voice_id
+
+
+def split_sentences(text, min_chars=20):
+    """
+    Découpe le texte en phrases pour la synthèse en pipeline.
+    
+    Les fragments trop courts sont regroupés avec la phrase suivante
+    pour garder une prosodie naturelle.
+    
+    Args:
+        text: Le texte complet
+        min_chars: Longueur minimale d'un segment
+    
+    Returns:
+        list: Liste de phrases
+    """
+    import re
+    
+    parts = [p.strip() for p in re.split(r'(?<=[.!?…;:])\s+', text.strip()) if p.strip()]
+    
+    sentences = []
+    pending = ''
+    for part in parts:
+        pending = f"{pending} {part}".strip()
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ''
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    
+    return sentences
+
+
+def normalize_waveform(wav):
+    """
+    Normalisation crête de Coqui (save_wav): pleine échelle, gain plafonné à 100.
+    
+    Appliquée une fois sur la forme d'onde en mémoire, elle redonne le niveau
+    de l'ancien tts_to_file pour l'audio retourné comme pour l'entrée mel de Wav2Lip.
+    """
+    import numpy as np
+    
+    return (wav * (1. / max(0.01, float(np.abs(wav).max(initial=0.))))).astype(np.float32, copy=False)
+
+
+def synthesize_waveform(text, language, speaker_kwargs, abort=None):
+    """
+    Synthétise une phrase avec XTTS et retourne la forme d'onde en mémoire.
+    
+    Args:
+        text: Phrase à synthétiser
+        language: Code langue
+        speaker_kwargs: Arguments speaker ou voice_id (voir resolve_speaker_kwargs)
+        abort: (optionnel) Appelée avant chaque appel au modèle (peut lever JobAborted)
+    
+    Returns:
+        tuple: (wav float32, sample_rate), normalisée (normalize_waveform)
+    """
+    import numpy as np
+    
+    tts = init_tts_model()
+    sample_rate = tts.synthesizer.output_sample_rate
+    
+    if 'voice_id' not in speaker_kwargs:
+        if abort is not None:
+            abort()
+        with MODEL_SCHEDULER.stage('tts'):
+            wav = tts.tts(text=text, language=language, **speaker_kwargs)
+        return normalize_waveform(np.asarray(wav, dtype=np.float32)), sample_rate
+    
+    # Voix enregistrée: inférence XTTS directe avec les latents en cache
+    xtts = tts.synthesizer.tts_model
+    device = next(xtts.parameters()).device
+    latents = get_voice_latents(speaker_kwargs['voice_id'])
+    gpt_cond_latent = latents['gpt_cond_latent'].to(device)
+    speaker_embedding = latents['speaker_embedding'].to(device)
+    
+    wavs = []
+    for sentence in split_sentences(text):
+        if abort is not None:
+            abort()
+        # Verrou par phrase: un autre job peut s'intercaler entre deux phrases
+        with MODEL_SCHEDULER.stage('tts'):
+            out = xtts.inference(sentence, language, gpt_cond_latent, speaker_embedding)
+        wav = out['wav']
+        if torch.is_tensor(wav):
+            wav = wav.cpu().numpy()
+        wavs.append(np.asarray(wav, dtype=np.float32).reshape(-1))
+    
+    return normalize_waveform(np.concatenate(wavs)), sample_rate
+
+
+WAV2LIP_URL = os.environ.get(
+    'WAV2LIP_URL',
+    # URL validée depuis Hugging Face (testée en local)
+    'https://huggingface.co/camenduru/Wav2Lip/resolve/main/checkpoints/wav2lip_gan.pth'
+)
+# Hash attendu du checkpoint (vide: celui publié par le serveur au téléchargement)
+WAV2LIP_SHA256 = os.environ.get('WAV2LIP_SHA256')
+
+
+def _sha256_file(file_path):
+    import hashlib
+    
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cached_sha256(file_path):
+    """Hash mémorisé dans le fichier voisin .sha256, None si absent ou périmé"""
+    try:
+        stat = os.stat(file_path)
+        with open(file_path + '.sha256') as f:
+            marker = json.load(f)
+        if marker['size'] == stat.st_size and marker['mtime'] == stat.st_mtime:
+            return marker['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _write_sha256_marker(file_path, digest):
+    """Mémorise le hash d'un fichier avec sa taille et sa date de modification"""
+    stat = os.stat(file_path)
+    try:
+        with open(file_path + '.sha256', 'w') as f:
+            json.dump({'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest}, f)
+    except OSError:
+        pass
+
+
+def _advertised_sha256(response):
+    """
+    Hash SHA-256 publié par le serveur pour le fichier complet.
+    
+    Hugging Face expose le hash de l'objet LFS dans X-Linked-Etag, sur la
+    redirection 302 de resolve/ (response.history) et non sur la réponse
+    finale du CDN; None si aucun hash n'est publié.
+    """
+    import re
+    
+    for hop in (*response.history, response):
+        for header in ('X-Linked-Etag', 'ETag'):
+            value = hop.headers.get(header, '').removeprefix('W/').strip('"').lower()
+            if re.fullmatch(r'[0-9a-f]{64}', value):
+                return value
+    return None
+
+
+def verify_model_file(file_path, sha256=None):
+    """
+    Vérifie l'intégrité d'un fichier modèle.
+    
+    Le hash calculé est mémorisé dans un fichier voisin (.sha256) avec la
+    taille et la date de modification: les démarrages suivants ne relisent
+    pas le fichier tant qu'il n'a pas changé. Sans hash attendu ni hash
+    mémorisé, le fichier n'est pas relu.
+    
+    Args:
+        file_path: Chemin du fichier
+        sha256: (optionnel) Hash attendu
+    
+    Returns:
+        bool: True si le fichier est présent et conforme
+    """
+    if not os.path.isfile(file_path):
+        return False
+    
+    digest = _cached_sha256(file_path)
+    if digest is None:
+        if not sha256:
+            return True
+        print(f"   🔍 Vérification du checksum: {os.path.basename(file_path)}")
+        digest = _sha256_file(file_path)
+        _write_sha256_marker(file_path, digest)
+    
+    if sha256 and digest != sha256.lower():
+        print(f"   ⚠️  Checksum invalide pour {file_path}: {digest}")
+        return False
+    return True
+
+
+def download_model_file(url, dest_path, sha256=None):
+    """
+    Télécharge un modèle de façon atomique, avec reprise.
+    
+    Le téléchargement se fait dans `dest_path + '.part'` (reprise via un
+    header Range si le fichier partiel existe), puis le fichier est vérifié
+    et renommé atomiquement. Sans hash attendu, celui publié par le serveur
+    est utilisé; le hash obtenu est mémorisé (.sha256) pour verify_model_file.
+    
+    Args:
+        url: URL du modèle
+        dest_path: Chemin final
+        sha256: (optionnel) Hash attendu
+    """
+    part_path = dest_path + '.part'
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    
+    with get_http_session().get(url, headers=headers, stream=True, timeout=(10, 60)) as response:
+        sha256 = sha256 or _advertised_sha256(response)
+        if response.status_code == 416:
+            # Fichier partiel déjà complet
+            pass
+        else:
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                # Le serveur ne gère pas Range: repartir de zéro
+                offset = 0
+            if offset:
+                print(f"   ⏯️  Reprise du téléchargement à {offset / 1e6:.1f} MB")
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                for block in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(block)
+    
+    digest = _sha256_file(part_path)
+    if sha256 and digest != sha256.lower():
+        os.remove(part_path)
+        raise ValueError(f"Checksum invalide après téléchargement: {url}")
+    if not sha256:
+        print(f"   ⚠️  Aucun hash publié pour {url}: fichier non vérifié")
+    
+    os.replace(part_path, dest_path)
+    _write_sha256_marker(dest_path, digest)
+
+
+def resolve_model_file(filename, url, sha256=None, legacy_paths=()):
+    """
+    Trouve un fichier modèle dans le store, sinon le télécharge.
+    
+    Args:
+        filename: Nom du fichier dans MODEL_STORE_DIR
+        url: URL de téléchargement
+        sha256: (optionnel) Hash attendu
+        legacy_paths: Autres emplacements à essayer (anciennes images)
+    
+    Returns:
+        str: Chemin vérifié du fichier
+    """
+    store_path = os.path.join(MODEL_STORE_DIR, filename)
+    
+    for candidate in (store_path, *legacy_paths):
+        if verify_model_file(candidate, sha256):
+            return candidate
+    
+    print(f"   📥 Téléchargement de {filename} vers {MODEL_STORE_DIR}...")
+    try:
+        download_model_file(url, store_path, sha256)
+    except Exception as e:
+        print(f"   ❌ Échec téléchargement: {e}")
+        raise Exception(f"Impossible de télécharger {filename}: {e}")
+    verify_model_file(store_path, sha256)
+    print(f"   ✅ Modèle téléchargé: {store_path}")
+    
+    return store_path
+
+
+def load_state_dict_file(checkpoint_path):
+    """
+    Charge les poids d'un checkpoint en mémoire mappée (CPU).
+    
+    Un fichier .safetensors voisin est utilisé en priorité s'il a été
+    converti depuis ce .pth (hash du .pth dans ses métadonnées); sinon le
+    .pth est chargé avec torch.load(mmap=True) et reconverti pour les
+    démarrages suivants. Le préfixe 'module.' (DataParallel) est retiré.
+    
+    Args:
+        checkpoint_path: Chemin du checkpoint .pth
+    
+    Returns:
+        dict: state_dict
+    """
+    safetensors_path = os.path.splitext(checkpoint_path)[0] + '.safetensors'
+    
+    try:
+        from safetensors import safe_open
+        from safetensors.torch import load_file, save_file
+    except ImportError:
+        load_file = save_file = None
+    
+    if load_file is not None and os.path.isfile(safetensors_path):
+        source_sha256 = _cached_sha256(checkpoint_path)
+        try:
+            with safe_open(safetensors_path, framework='pt') as f:
+                converted_from = (f.metadata() or {}).get('source_sha256')
+            if source_sha256 is not None and converted_from == source_sha256:
+                return load_file(safetensors_path, device='cpu')
+            print(f"   ♻️  safetensors périmé (source {str(converted_from)[:12]}), reconversion")
+        except Exception as e:
+            print(f"   ⚠️  safetensors illisible ({e}), reconversion")
+    
+    try:
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', mmap=True)
+    except (RuntimeError, TypeError):
+        # Ancien format (non zip) ou torch sans mmap: chargement classique
+        checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    
+    s = checkpoint.get('state_dict', checkpoint)
+    state_dict = {}
+    for k, v in s.items():
+        state_dict[k.replace('module.', '')] = v
+    
+    if save_file is not None:
+        # Hash de la source (une seule lecture, à la conversion) pour valider le safetensors
+        source_sha256 = _cached_sha256(checkpoint_path)
+        if source_sha256 is None:
+            source_sha256 = _sha256_file(checkpoint_path)
+            _write_sha256_marker(checkpoint_path, source_sha256)
+        tmp_path = f"{safetensors_path}.{os.getpid()}.tmp"
+        try:
+            save_file({k: v.contiguous() for k, v in state_dict.items()}, tmp_path,
+                      metadata={'source_sha256': source_sha256})
+            os.replace(tmp_path, safetensors_path)
+        except OSError as e:
+            print(f"   ⚠️  Conversion safetensors impossible: {e}")
+    
+    return state_dict
+
+
+# Backend d'inférence Wav2Lip (surtout utile sur CPU)
+WAV2LIP_BACKENDS = ('eager', 'torchscript', 'compile', 'int8_static', 'onnx')
+# 'auto': ONNX Runtime sur CPU si l'artefact exporté existe, sinon eager
+WAV2LIP_BACKEND = os.environ.get('WAV2LIP_BACKEND', 'auto')
+WAV2LIP_ONNX_PATH = os.environ.get('WAV2LIP_ONNX_PATH', os.path.join(MODEL_STORE_DIR, 'wav2lip_gan.onnx'))
+WAV2LIP_ONNX_OPSET = int(os.environ.get('WAV2LIP_ONNX_OPSET', '17'))
+WAV2LIP_QUANT_CALIBRATION_BATCHES = int(os.environ.get('WAV2LIP_QUANT_CALIBRATION_BATCHES', '8'))
+
+
+def wav2lip_example_inputs(batch_size, device='cpu', seed=0):
+    """
+    Génère des entrées Wav2Lip synthétiques (mel, visage) de forme réaliste.
+    
+    Args:
+        batch_size: Nombre d'échantillons
+        device: Device cible
+        seed: Graine du générateur (entrées reproductibles)
+    
+    Returns:
+        tuple: (mel (N, 1, 80, 16), visage (N, 6, 96, 96)) float32
+    """
+    generator = torch.Generator().manual_seed(seed)
+    mel = torch.rand((batch_size, 1, 80, MEL_STEP_SIZE), generator=generator) * 8. - 4.
+    face = torch.rand((batch_size, 6, IMG_SIZE, IMG_SIZE), generator=generator) * 2. - 1.
+    face[:, :3, IMG_SIZE // 2:] = -1.
+    return mel.to(device), face.to(device)
+
+
+class ChannelsLastModel(torch.nn.Module):
+    """Enveloppe qui passe l'entrée visage en channels_last avant le modèle"""
+    
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, mel, face):
+        return self.model(mel, face.contiguous(memory_format=torch.channels_last))
+
+
+def export_wav2lip_onnx(model, output_path=None, opset=None):
+    """
+    Exporte le modèle Wav2Lip eager en graphe ONNX (dimension batch dynamique).
+    
+    L'écriture est atomique: un worker ne voit jamais d'artefact partiel.
+    
+    Args:
+        model: Modèle Wav2Lip eager (mode eval)
+        output_path: Fichier .onnx (default: WAV2LIP_ONNX_PATH)
+        opset: Version d'opset ONNX (default: WAV2LIP_ONNX_OPSET)
+    
+    Returns:
+        str: Chemin de l'artefact
+    """
+    import copy
+    
+    output_path = output_path or WAV2LIP_ONNX_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.part"
+    
+    print(f"   📦 Export ONNX de Wav2Lip: {output_path}")
+    # Copie CPU: le modèle en service peut rester sur GPU
+    cpu_model = copy.deepcopy(model).to('cpu').eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            cpu_model,
+            wav2lip_example_inputs(2),
+            tmp_path,
+            input_names=['mel', 'face'],
+            output_names=['pred'],
+            dynamic_axes={'mel': {0: 'batch'}, 'face': {0: 'batch'}, 'pred': {0: 'batch'}},
+            opset_version=opset or WAV2LIP_ONNX_OPSET,
+            do_constant_folding=True,
+        )
+    os.replace(tmp_path, output_path)
+    print(f"   ✓ Export ONNX terminé ({os.path.getsize(output_path) / 1e6:.1f} MB)")
+    return output_path
+
+
+class OnnxWav2Lip:
+    """
+    Exécute le graphe Wav2Lip exporté avec ONNX Runtime (CPUExecutionProvider).
+    
+    Même signature que le modèle torch: model(mel, visage) sur des tenseurs
+    CPU, sans copie à l'entrée ni à la sortie.
+    """
+    
+    def __init__(self, onnx_path):
+        import onnxruntime as ort
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = torch.get_num_threads()
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+    
+    def __call__(self, mel, face):
+        import numpy as np
+        
+        pred, = self.session.run(None, {
+            'mel': np.ascontiguousarray(mel.detach().cpu().numpy(), dtype=np.float32),
+            'face': np.ascontiguousarray(face.detach().cpu().numpy(), dtype=np.float32),
+        })
+        return torch.from_numpy(pred)
+
+
+class Wav2LipFrames(torch.nn.Module):
+    """
+    Chemin 4-D de Wav2Lip.forward (une image par échantillon), traçable par FX.
+    
+    Le forward d'origine branche sur len(face.size()), que torch.fx ne sait
+    pas tracer: on réutilise directement les sous-modules du modèle.
+    """
+    
+    def __init__(self, model):
+        super().__init__()
+        self.audio_encoder = model.audio_encoder
+        self.face_encoder_blocks = model.face_encoder_blocks
+        self.face_decoder_blocks = model.face_decoder_blocks
+        self.output_block = model.output_block
+    
+    def forward(self, mel, face):
+        feats = []
+        x = face
+        for block in self.face_encoder_blocks:
+            x = block(x)
+            feats.append(x)
+        
+        x = self.audio_encoder(mel)
+        for block in self.face_decoder_blocks:
+            x = torch.cat((block(x), feats.pop()), dim=1)
+        
+        return self.output_block(x)
+
+
+def _quantize_static(model, calibration_batches):
+    """Quantification int8 statique (FX graph mode) des convolutions, calibrée sur des entrées synthétiques"""
+    import copy
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+    
+    example = wav2lip_example_inputs(2)
+    frames_model = Wav2LipFrames(copy.deepcopy(model).cpu()).eval()
+    prepared = prepare_fx(frames_model, get_default_qconfig_mapping('x86'), example)
+    with torch.no_grad():
+        for seed in range(calibration_batches):
+            prepared(*wav2lip_example_inputs(16, seed=seed + 1))
+    return convert_fx(prepared)
+
+
+def build_inference_backend(model, device, backend):
+    """
+    Construit le backend d'inférence Wav2Lip demandé à partir du modèle eager.
+    
+    Chaque backend garde la signature model(mel, visage). Il est validé par
+    un appel factice: en cas d'échec (compilateur absent, opérateur non
+    quantifiable...), on retombe sur le modèle eager.
+    
+    Args:
+        model: Modèle Wav2Lip eager (mode eval)
+        device: 'cuda' ou 'cpu'
+        backend: Un de WAV2LIP_BACKENDS, ou 'auto'
+    
+    Returns:
+        tuple: (modèle, nom du backend effectif)
+    """
+    import copy
+    
+    if backend == 'auto':
+        backend = 'onnx' if device == 'cpu' and os.path.exists(WAV2LIP_ONNX_PATH) else 'eager'
+    if backend not in WAV2LIP_BACKENDS:
+        raise ValueError(f"Backend Wav2Lip inconnu: {backend} (attendu: {', '.join(WAV2LIP_BACKENDS)})")
+    if backend == 'eager':
+        return model, 'eager'
+    if (backend.startswith('int8') or backend == 'onnx') and device != 'cpu':
+        print(f"   ⚠️  Backend {backend} réservé au CPU, utilisation du modèle eager")
+        return model, 'eager'
+    
+    try:
+        example = wav2lip_example_inputs(2, device)
+        if backend == 'torchscript':
+            wrapped = ChannelsLastModel(copy.deepcopy(model).to(memory_format=torch.channels_last)).eval()
+            with torch.no_grad():
+                traced = torch.jit.trace(wrapped, example)
+            optimized = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        elif backend == 'compile':
+            optimized = torch.compile(
+                ChannelsLastModel(copy.deepcopy(model).to(memory_format=torch.channels_last)).eval(),
+                dynamic=True
+            )
+        elif backend == 'int8_static':
+            optimized = _quantize_static(model, WAV2LIP_QUANT_CALIBRATION_BATCHES)
+        else:
+            optimized = OnnxWav2Lip(WAV2LIP_ONNX_PATH)
+        
+        with torch.no_grad():
+            output = optimized(*example)
+            # Seconde taille de batch: vérifie que la dimension batch reste dynamique
+            optimized(*wav2lip_example_inputs(3, device))
+            if backend == 'onnx':
+                # Artefact exporté depuis un autre checkpoint: ne pas le servir
+                diff = (output.float().cpu() - model(*example).float().cpu()).abs().max().item()
+                if diff > 1e-3:
+                    raise ValueError(f"écart {diff:.4f} avec le modèle torch ({WAV2LIP_ONNX_PATH})")
+        return optimized, backend
+    
+    except Exception as e:
+        print(f"   ⚠️  Backend {backend} indisponible ({type(e).__name__}: {e}), utilisation du modèle eager")
+        return model, 'eager'
+
+
+def benchmark_backends(backends=None, batch_size=32, iterations=8):
+    """
+    Compare les backends Wav2Lip: débit (frames/s) et écart max avec eager.
+    
+    L'écart est exprimé en niveaux de pixel (sortie × 255) sur les mêmes
+    entrées: un écart de quelques niveaux reste visuellement équivalent.
+    
+    Args:
+        backends: Backends à tester (default: WAV2LIP_BACKENDS)
+        batch_size: Taille de batch mesurée
+        iterations: Nombre de batches chronométrés par backend
+    
+    Returns:
+        dict: {backend: {'frames_per_second', 'max_abs_diff', 'mean_abs_diff'}}
+    """
+    import time
+    
+    wav2lip_data = init_wav2lip_model()
+    eager_model = wav2lip_data['eager_model']
+    device = wav2lip_data['device']
+    
+    print(f"\n🏁 Benchmark des backends Wav2Lip ({_device_signature(device)}, batch {batch_size})...")
+    
+    mel, face = wav2lip_example_inputs(batch_size, device, seed=1234)
+    with torch.no_grad():
+        reference = eager_model(mel, face).float().cpu()
+    
+    results = {}
+    for backend in backends or WAV2LIP_BACKENDS:
+        model, effective = build_inference_backend(eager_model, device, backend)
+        if effective != backend:
+            results[backend] = {'available': False}
+            continue
+        
+        with MODEL_SCHEDULER.stage('wav2lip'), torch.no_grad():
+            output = model(mel, face).float().cpu()  # préchauffage (compilation)
+            if device == 'cuda':
+                torch.cuda.synchronize()
+            start_time = time.perf_counter()
+            for _ in range(iterations):
+                model(mel, face).cpu()
+            elapsed = time.perf_counter() - start_time
+        
+        diff = (output - reference).abs() * 255.
+        results[backend] = {
+            'available': True,
+            'frames_per_second': round(batch_size * iterations / elapsed, 1),
+            'max_abs_diff': round(diff.max().item(), 3),
+            'mean_abs_diff': round(diff.mean().item(), 4),
+        }
+        print(f"   📊 {backend}: {results[backend]['frames_per_second']} frames/s, "
+              f"écart max {results[backend]['max_abs_diff']} (moyen {results[backend]['mean_abs_diff']})")
+    
+    print(json.dumps({'wav2lip_backends': results}))
+    return results
+
+
+class FaceDetectorPool:
+    """
+    Pool de détecteurs MediaPipe partagé entre jobs concurrents.
+    
+    Un graphe MediaPipe n'est pas réentrant: chaque appel à process()
+    emprunte un détecteur libre (créé à la demande, au plus `size`).
+    S'utilise comme un FaceDetection classique.
+    """
+    
+    def __init__(self, factory, size):
+        import queue
+        
+        self.factory = factory
+        self.size = size
+        self.created = 0
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+    
+    def _acquire(self):
+        import queue
+        
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self.factory()
+            except Exception:
+                with self.lock:
+                    self.created -= 1
+                raise
+        return self.idle.get()
+    
+    def process(self, rgb_frame):
+        detector = self._acquire()
+        try:
+            return detector.process(rgb_frame)
+        finally:
+            self.idle.put(detector)
+
+
+def get_face_detector():
+    """
+    Initialise le pool de détecteurs MediaPipe, indépendamment de Wav2Lip.
+    
+    La détection du visage ne dépend pas des poids Wav2Lip: elle peut
+    rejeter une image sans visage pendant que le checkpoint se charge.
+    """
+    global FACE_DETECTOR
+    import time
+    
+    if FACE_DETECTOR is not None:
+        return FACE_DETECTOR
+    
+    with FACE_DETECTOR_INIT_LOCK:
+        if FACE_DETECTOR is None:
+            # Initialiser MediaPipe Face Detection (compatible MediaPipe 0.10+)
+            mediapipe_start = time.time()
+            from mediapipe.python.solutions import face_detection as mp_face_detection
+            def make_detector():
+                return mp_face_detection.FaceDetection(
+                    min_detection_confidence=0.5,
+                    model_selection=0  # 0 pour courte distance (< 2m)
+                )
+            
+            # Un détecteur par job concurrent; le premier est créé tout de suite
+            face_detector = FaceDetectorPool(make_detector, MAX_CONCURRENT_JOBS)
+            face_detector.idle.put(make_detector())
+            face_detector.created = 1
+            
+            COLD_START_TIMINGS['mediapipe_init'] = round(time.time() - mediapipe_start, 3)
+            FACE_DETECTOR = face_detector
+    
+    return FACE_DETECTOR
+
+
+def init_wav2lip_model():
+    """Initialise le modèle Wav2Lip pour génération vidéo"""
+    if WAV2LIP_MODEL is not None:
+        return WAV2LIP_MODEL
+    
+    with WAV2LIP_INIT_LOCK:
+        if WAV2LIP_MODEL is None:
+            _load_wav2lip_model()
+    
+    return WAV2LIP_MODEL
+
+
+def _load_wav2lip_model():
+    """Charge Wav2Lip et MediaPipe (appelé sous WAV2LIP_INIT_LOCK)"""
+    global WAV2LIP_MODEL
+    import time
+    
+    if WAV2LIP_MODEL is None:
+        start_time = time.time()
+        print("\n🎬 Chargement du modèle Wav2Lip...")
+        import sys
+        sys.path.append('/app/Wav2Lip')
+        
+        try:
+            from models import Wav2Lip as Wav2LipModel
+            
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            print(f"   📱 Device: {device}")
+            
+            # Résoudre le checkpoint dans le store (vérifié, téléchargé si absent)
+            checkpoint_path = resolve_model_file(
+                'wav2lip_gan.pth', WAV2LIP_URL, WAV2LIP_SHA256,
+                legacy_paths=['/app/Wav2Lip/checkpoints/wav2lip_gan.pth']
+            )
+            
+            # Charger le modèle (poids en mémoire mappée, sans double copie sur CPU)
+            print(f"   ⏳ Chargement du checkpoint Wav2Lip...")
+            model = Wav2LipModel()
+            state_dict = load_state_dict_file(checkpoint_path)
+            model.load_state_dict(state_dict, assign=(device == 'cpu'))
+            
+            model = model.to(device)
+            model.eval()
+            
+            # Backend d'inférence sélectionné (WAV2LIP_BACKEND)
+            eager_model = model
+            model, backend = build_inference_backend(eager_model, device, WAV2LIP_BACKEND)
+            print(f"   ⚙️  Backend d'inférence: {backend}")
+            COLD_START_TIMINGS['wav2lip_load'] = round(time.time() - start_time, 3)
+            
+            WAV2LIP_MODEL = {
+                'model': model,
+                'eager_model': eager_model,
+                'backend': backend,
+                'device': device,
+                'face_detector': get_face_detector(),
+            }
+            print(f"   ✅ Modèle Wav2Lip chargé avec succès ({COLD_START_TIMINGS['wav2lip_load']}s)")
+            
+        except Exception as e:
+            print(f"   ❌ ERREUR chargement Wav2Lip: {e}")
+            import traceback
+            traceback.print_exc()
+            raise
+
+
+# Préchauffage des modèles au démarrage du worker (opt-in)
+WARMUP_ON_BOOT = os.environ.get('WARMUP_ON_BOOT', '0') == '1'
+
+
+def _warmup_tts():
+    """Charge XTTS puis exécute une synthèse factice (noyaux, caches)"""
+    import time
+    
+    init_tts_model()
+    start_time = time.time()
+    synthesize_waveform("Bonjour.", 'fr', {'speaker': 'Claribel Dervla'})
+    COLD_START_TIMINGS['tts_warmup'] = round(time.time() - start_time, 3)
+
+
+def _warmup_wav2lip():
+    """Charge Wav2Lip puis exécute un batch factice et une détection de visage"""
+    import time
+    import numpy as np
+    
+    wav2lip_data = init_wav2lip_model()
+    model = wav2lip_data['model']
+    device = wav2lip_data['device']
+    
+    start_time = time.time()
+    img_batch = torch.zeros((1, 6, IMG_SIZE, IMG_SIZE), device=device)
+    mel_batch = torch.zeros((1, 1, 80, MEL_STEP_SIZE), device=device)
+    with torch.no_grad():
+        model(mel_batch, img_batch)
+    detect_face_box(np.zeros((IMG_SIZE * 2, IMG_SIZE * 2, 3), dtype=np.uint8), wav2lip_data['face_detector'])
+    if device == 'cuda':
+        torch.cuda.synchronize()
+    COLD_START_TIMINGS['wav2lip_warmup'] = round(time.time() - start_time, 3)
+
+
+def warmup_models():
+    """
+    Charge XTTS et Wav2Lip en parallèle puis exécute une inférence factice de chacun.
+    
+    Appelé avant runpod.serverless.start quand WARMUP_ON_BOOT=1: le worker
+    n'accepte de jobs qu'une fois chaud. Les temps par composant sont
+    stockés dans COLD_START_TIMINGS et loggés en une ligne JSON.
+    
+    Returns:
+        dict: Temps de démarrage à froid par composant (secondes)
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    
+    print("\n🔥 Préchauffage des modèles (XTTS + Wav2Lip en parallèle)...")
+    start_time = time.time()
+    
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(_warmup_tts), pool.submit(_warmup_wav2lip)]
+        for future in futures:
+            future.result()
+    
+    COLD_START_TIMINGS['total'] = round(time.time() - start_time, 3)
+    print(json.dumps({'event': 'cold_start', 'timings': COLD_START_TIMINGS}))
+    print(f"   ✅ Worker chaud en {COLD_START_TIMINGS['total']}s")
+    
+    return dict(COLD_START_TIMINGS)
+
+
+# Encodage vidéo: frames BGR brutes → ffmpeg (H.264 + audio AAC en une passe)
+VIDEO_PRESET = os.environ.get('VIDEO_PRESET', 'veryfast')
+VIDEO_CRF = int(os.environ.get('VIDEO_CRF', '23'))
+AUDIO_BITRATE = os.environ.get('AUDIO_BITRATE', '128k')
+# Taille minimale des morceaux de MP4 fragmenté publiés en streaming
+STREAM_CHUNK_BYTES = int(os.environ.get('STREAM_CHUNK_KB', '256')) * 1024
+
+
+class FFmpegWriter:
+    """
+    Encodeur vidéo via un processus ffmpeg alimenté par un pipe.
+    
+    Même interface que cv2.VideoWriter (write/release). Les frames BGR
+    sont envoyées brutes sur stdin, encodées en H.264 et, si un audio est
+    fourni, multiplexées dans la même passe. Le MP4 produit est
+    directement lisible (faststart).
+    """
+    
+    def __init__(self, output_path, fps, frame_size, audio_path=None,
+                 preset=VIDEO_PRESET, crf=VIDEO_CRF, waveform=None, on_fragment=None):
+        frame_w, frame_h = frame_size
+        self.output_path = output_path
+        self.stderr = tempfile.TemporaryFile()
+        self.audio_thread = None
+        self.fragment_thread = None
+        self.frames_written = 0
+        
+        cmd = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{frame_w}x{frame_h}', '-r', str(fps),
+            '-i', 'pipe:0',
+        ]
+        pass_fds = ()
+        if waveform is not None:
+            # Audio en mémoire: float32 brut sur un second pipe, écrit par un thread
+            audio_read_fd, audio_write_fd = os.pipe()
+            cmd += ['-f', 'f32le', '-ar', str(waveform[1]), '-ac', '1', '-i', f'pipe:{audio_read_fd}']
+            pass_fds = (audio_read_fd,)
+        elif audio_path:
+            cmd += ['-i', audio_path]
+        has_audio = waveform is not None or bool(audio_path)
+        cmd += [
+            '-map', '0:v:0',
+            # yuv420p exige des dimensions paires
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+            '-c:v', 'libx264', '-preset', str(preset), '-crf', str(crf),
+            '-pix_fmt', 'yuv420p',
+        ]
+        if has_audio:
+            cmd += ['-map', '1:a:0', '-c:a', 'aac', '-b:a', AUDIO_BITRATE, '-shortest']
+        if on_fragment is None:
+            cmd += ['-movflags', '+faststart', output_path]
+        else:
+            # MP4 fragmenté (une image clé par seconde) lu sur stdout au fil de l'encodage
+            cmd += ['-g', str(int(round(fps))),
+                    '-movflags', '+frag_keyframe+empty_moov+default_base_moof',
+                    '-f', 'mp4', 'pipe:1']
+        
+        self.proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stderr=self.stderr, pass_fds=pass_fds,
+            stdout=subprocess.PIPE if on_fragment is not None else None
+        )
+        
+        if on_fragment is not None:
+            self.fragment_thread = threading.Thread(
+                target=self._read_fragments, args=(on_fragment,), daemon=True
+            )
+            self.fragment_thread.start()
+        
+        if waveform is not None:
+            os.close(audio_read_fd)
+            self.audio_thread = threading.Thread(
+                target=self._write_audio, args=(audio_write_fd, waveform[0]), daemon=True
+            )
+            self.audio_thread.start()
+    
+    @staticmethod
+    def _write_audio(fd, wav):
+        import numpy as np
+        
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(np.ascontiguousarray(wav, dtype=np.float32).data)
+        except BrokenPipeError:
+            pass
+    
+    def _read_fragments(self, on_fragment):
+        """Recopie la sortie ffmpeg dans output_path et la publie par morceaux"""
+        pending = bytearray()
+        with open(self.output_path, 'wb') as f:
+            while True:
+                data = self.proc.stdout.read1(1 << 20)
+                if data:
+                    f.write(data)
+                    pending += data
+                if pending and (not data or len(pending) >= STREAM_CHUNK_BYTES):
+                    on_fragment(bytes(pending), self.frames_written)
+                    pending.clear()
+                if not data:
+                    break
+    
+    def write(self, frame):
+        try:
+            self.proc.stdin.write(frame.tobytes() if not frame.flags.c_contiguous else frame.data)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg s'est arrêté: {self._error_output()}")
+        self.frames_written += 1
+    
+    def release(self):
+        if self.proc.stdin and not self.proc.stdin.closed:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = self.proc.wait()
+        if self.audio_thread is not None:
+            self.audio_thread.join()
+        if self.fragment_thread is not None:
+            self.fragment_thread.join()
+        error_output = self._error_output()
+        self.stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg a échoué ({returncode}): {error_output}")
+    
+    def _error_output(self):
+        self.stderr.seek(0)
+        return self.stderr.read().decode('utf-8', errors='replace').strip()
+
+
+def open_video_writer(output_path, fps, frame_size, audio_path=None, encode_options=None, waveform=None):
+    """
+    Ouvre l'encodeur vidéo (ffmpeg si disponible, sinon cv2.VideoWriter).
+    
+    Args:
+        output_path: Chemin de sortie MP4
+        fps: Images par seconde
+        frame_size: (largeur, hauteur)
+        audio_path: (optionnel) Audio à multiplexer dans la même passe
+        encode_options: (optionnel) {'preset': ..., 'crf': ..., 'on_fragment': ...}
+        waveform: (optionnel) (wav, sample_rate) en mémoire, prioritaire sur audio_path
+    
+    Returns:
+        Objet avec write(frame) et release()
+    """
+    import shutil
+    
+    if shutil.which('ffmpeg'):
+        return FFmpegWriter(output_path, fps, frame_size, audio_path, waveform=waveform,
+                            **(encode_options or {}))
+    
+    import cv2
+    print("   ⚠️  ffmpeg introuvable, encodage mp4v sans audio (cv2)")
+    return cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, frame_size)
+
+
+def mux_audio(video_path, audio_path, output_path):
+    """
+    Multiplexe un audio dans une vidéo déjà encodée, sans réencoder la vidéo.
+    
+    Args:
+        video_path: Vidéo H.264 sans audio
+        audio_path: Audio à ajouter
+        output_path: MP4 final (faststart)
+    """
+    cmd = [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-i', video_path, '-i', audio_path,
+        '-map', '0:v:0', '-map', '1:a:0',
+        '-c:v', 'copy', '-c:a', 'aac', '-b:a', AUDIO_BITRATE,
+        '-shortest', '-movflags', '+faststart', output_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg (mux audio) a échoué: {result.stderr.strip()}")
+
+
+# Paramètres Wav2Lip
+MEL_STEP_SIZE = 16
+IMG_SIZE = 96
+FPS = 25
+PADS = [0, 10, 0, 0]  # top, bottom, left, right
+
+
+# Taille de batch Wav2Lip: variable d'env > calibration persistée > autotune > défaut
+BATCH_SIZE = 128  # défaut si aucune calibration
+BATCH_SIZE_CANDIDATES = [16, 32, 64, 128, 256]
+AUTOTUNE_BATCH_SIZE = os.environ.get('AUTOTUNE_BATCH_SIZE', '0') == '1'
+BATCH_CALIBRATION_PATH = os.environ.get(
+    'BATCH_CALIBRATION_PATH',
+    os.path.join(MODEL_STORE_DIR, 'batch_size_calibration.json')
+)
+
+ACTIVE_BATCH_SIZE = None
+BATCH_SIZE_LOCK = threading.Lock()
+
+
+def _device_signature(device):
+    """Identifie le matériel pour lequel une calibration est valable"""
+    import platform
+    
+    if device == 'cuda':
+        hardware = torch.cuda.get_device_name(0)
+    else:
+        hardware = platform.processor() or platform.machine()
+    backend = WAV2LIP_MODEL['backend'] if WAV2LIP_MODEL is not None else WAV2LIP_BACKEND
+    return f"{device}|{hardware}|cpus={os.cpu_count()}|threads={torch.get_num_threads()}|{backend}"
+
+
+# Messages des allocateurs: CUDA ("out of memory") et CPU (DefaultCPUAllocator)
+OUT_OF_MEMORY_MESSAGES = ('out of memory', "can't allocate memory", 'cannot allocate memory')
+
+
+def _is_out_of_memory(error):
+    if isinstance(error, MemoryError):
+        return True
+    oom_error = getattr(torch.cuda, 'OutOfMemoryError', None)
+    if oom_error is not None and isinstance(error, oom_error):
+        return True
+    message = str(error).lower()
+    return any(text in message for text in OUT_OF_MEMORY_MESSAGES)
+
+
+def predict_batch(model, device, img_batch, mel_batch, out_size=None):
+    """
+    Inférence Wav2Lip sur un batch, découpé en deux en cas de manque de mémoire.
+    
+    Après un manque de mémoire, la taille de batch active est réduite pour
+    les batches et jobs suivants.
+    
+    Args:
+        model: Modèle Wav2Lip
+        device: 'cuda' ou 'cpu'
+        img_batch: Visages (N, 6, 96, 96) float32 normalisés
+        mel_batch: Mel chunks (N, 1, 80, 16) float32
+        out_size: (optionnel) (largeur, hauteur): redimensionne tout le batch
+            en une seule opération, sur le device du modèle
+    
+    Returns:
+        ndarray: Prédictions (N, H, W, 3) dans [0, 255]
+    """
+    global ACTIVE_BATCH_SIZE
+    import numpy as np
+    
+    try:
+        # Pas de copie sur CPU: le modèle lit directement les buffers de batch
+        img_tensor = torch.from_numpy(img_batch).to(device, non_blocking=True)
+        mel_tensor = torch.from_numpy(mel_batch).to(device, non_blocking=True)
+        
+        with MODEL_SCHEDULER.stage('wav2lip'), torch.no_grad():
+            pred = model(mel_tensor, img_tensor)
+            if out_size is not None:
+                pred = torch.nn.functional.interpolate(
+                    pred, size=(out_size[1], out_size[0]), mode='bilinear', align_corners=False
+                )
+            pred = pred.cpu().numpy()
+
+        return pred.transpose(0, 2, 3, 1) * 255.
+    
+    except (RuntimeError, MemoryError) as e:
+        n = len(img_batch)
+        if n <= 1 or not _is_out_of_memory(e):
+            raise
+        if device == 'cuda':
+            torch.cuda.empty_cache()
+        
+        half = n // 2
+        with BATCH_SIZE_LOCK:
+            ACTIVE_BATCH_SIZE = max(1, min(ACTIVE_BATCH_SIZE or half, half))
+        print(f"   ⚠️  Mémoire insuffisante pour un batch de {n}, passage à {half}")
+        
+        return np.concatenate([
+            predict_batch(model, device, img_batch[:half], mel_batch[:half], out_size),
+            predict_batch(model, device, img_batch[half:], mel_batch[half:], out_size),
+        ])
+
+
+def load_batch_calibration(device):
+    """
+    Lit la taille de batch calibrée pour le matériel courant.
+    
+    Returns:
+        int: Taille calibrée ou None
+    """
+    try:
+        with open(BATCH_CALIBRATION_PATH) as f:
+            calibrations = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    entry = calibrations.get(_device_signature(device))
+    return entry['batch_size'] if entry else None
+
+
+def calibrate_batch_size(candidates=None, min_frames=256):
+    """
+    Mesure le débit Wav2Lip (frames/s) pour plusieurs tailles de batch.
+    
+    La meilleure taille est persistée dans BATCH_CALIBRATION_PATH pour le
+    matériel courant (device, nombre de CPUs et de threads torch).
+    
+    Args:
+        candidates: Tailles à tester (default: BATCH_SIZE_CANDIDATES)
+        min_frames: Nombre minimal de frames mesurées par taille
+    
+    Returns:
+        int: Meilleure taille de batch
+    """
+    import time
+    
+    wav2lip_data = init_wav2lip_model()
+    model = wav2lip_data['model']
+    device = wav2lip_data['device']
+    
+    print(f"\n📐 Calibration de la taille de batch Wav2Lip ({_device_signature(device)})...")
+    
+    results = {}
+    for batch_size in candidates or BATCH_SIZE_CANDIDATES:
+        img_batch = torch.zeros((batch_size, 6, IMG_SIZE, IMG_SIZE), device=device)
+        mel_batch = torch.zeros((batch_size, 1, 80, MEL_STEP_SIZE), device=device)
+        iterations = max(2, -(-min_frames // batch_size))
+        
+        try:
+            # Mesure exclusive: un job concurrent fausserait le débit
+            with MODEL_SCHEDULER.stage('wav2lip'), torch.no_grad():
+                model(mel_batch, img_batch)  # préchauffage
+                if device == 'cuda':
+                    torch.cuda.synchronize()
+                start_time = time.time()
+                for _ in range(iterations):
+                    model(mel_batch, img_batch).cpu()
+                elapsed = time.time() - start_time
+        except (RuntimeError, MemoryError) as e:
+            if not _is_out_of_memory(e):
+                raise
+            print(f"   ⚠️  Batch {batch_size}: mémoire insuffisante, arrêt")
+            break
+        finally:
+            del img_batch, mel_batch
+            if device == 'cuda':
+                torch.cuda.empty_cache()
+        
+        results[batch_size] = round(batch_size * iterations / elapsed, 1)
+        print(f"   📊 Batch {batch_size}: {results[batch_size]} frames/s")
+    
+    if not results:
+        raise RuntimeError("Calibration impossible: aucune taille de batch ne tient en mémoire")
+    
+    best = max(results, key=results.get)
+    
+    try:
+        with open(BATCH_CALIBRATION_PATH) as f:
+            calibrations = json.load(f)
+    except (OSError, ValueError):
+        calibrations = {}
+    calibrations[_device_signature(device)] = {
+        'batch_size': best,
+        'frames_per_second': {str(k): v for k, v in results.items()},
+    }
+    os.makedirs(os.path.dirname(BATCH_CALIBRATION_PATH), exist_ok=True)
+    tmp_path = f"{BATCH_CALIBRATION_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(calibrations, f, indent=2)
+    os.replace(tmp_path, BATCH_CALIBRATION_PATH)
+    
+    print(f"   ✅ Taille de batch retenue: {best}")
+    return best
+
+
+def get_batch_size():
+    """
+    Retourne la taille de batch Wav2Lip à utiliser.
+    
+    Ordre de priorité: WAV2LIP_BATCH_SIZE, calibration persistée pour ce
+    matériel, calibration à la volée (AUTOTUNE_BATCH_SIZE=1), BATCH_SIZE.
+    La valeur peut ensuite diminuer en cas de manque de mémoire.
+    
+    Returns:
+        int: Taille de batch
+    """
+    global ACTIVE_BATCH_SIZE
+    
+    if ACTIVE_BATCH_SIZE is not None:
+        return ACTIVE_BATCH_SIZE
+    
+    with BATCH_SIZE_LOCK:
+        if ACTIVE_BATCH_SIZE is None:
+            if os.environ.get('WAV2LIP_BATCH_SIZE'):
+                ACTIVE_BATCH_SIZE = int(os.environ['WAV2LIP_BATCH_SIZE'])
+            else:
+                device = init_wav2lip_model()['device']
+                ACTIVE_BATCH_SIZE = load_batch_calibration(device)
+                if ACTIVE_BATCH_SIZE is None:
+                    ACTIVE_BATCH_SIZE = calibrate_batch_size() if AUTOTUNE_BATCH_SIZE else BATCH_SIZE
+            print(f"   📦 Taille de batch Wav2Lip: {ACTIVE_BATCH_SIZE}")
+    
+    return ACTIVE_BATCH_SIZE
+
+
+def load_face(image_path, face_detector):
+    """
+    Charge l'image et détecte le visage avec MediaPipe.
+    
+    Args:
+        image_path: Chemin vers l'image
+        face_detector: Détecteur MediaPipe
+    
+    Returns:
+        tuple: (frame, face_rect, coords) avec coords = (y1, y2, x1, x2)
+    """
+    import cv2
+    from os import path
+    
+    print("   📸 Détection du visage...")
+    
+    # Charger l'image
+    if not path.isfile(image_path):
+        raise ValueError(f'Image non trouvée: {image_path}')
+    
+    # Créer une vidéo statique à partir de l'image
+    frame = cv2.imread(image_path)
+    
+    if frame is None:
+        raise ValueError(f"Impossible de charger l'image: {image_path}")
+    
+    # Détecter les visages avec MediaPipe
+    print("   👤 Détection des visages...")
+    coords = detect_face_box(frame, face_detector)
+    
+    if coords is None:
+        raise ValueError("Aucun visage détecté dans l'image")
+    
+    # Extraire la région du visage (une seule fois: l'image est fixe)
+    y1, y2, x1, x2 = coords
+    face_rect = frame[y1:y2, x1:x2]
+    
+    return frame, face_rect, (y1, y2, x1, x2)
+
+
+def detect_face_box(frame, face_detector):
+    """
+    Détecte le premier visage d'une frame et applique les paddings.
+    
+    Args:
+        frame: Image BGR
+        face_detector: Détecteur MediaPipe
+    
+    Returns:
+        tuple: (y1, y2, x1, x2) ou None si aucun visage
+    """
+    import cv2
+    
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    results = face_detector.process(rgb_frame)
+    
+    if not results.detections:
+        return None
+    
+    # Utiliser le premier visage détecté
+    detection = results.detections[0]
+    bboxC = detection.location_data.relative_bounding_box
+    ih, iw, _ = frame.shape
+    
+    # Convertir les coordonnées relatives en pixels
+    x1 = int(bboxC.xmin * iw)
+    y1 = int(bboxC.ymin * ih)
+    w = int(bboxC.width * iw)
+    h = int(bboxC.height * ih)
+    x2 = x1 + w
+    y2 = y1 + h
+    
+    # Appliquer les paddings
+    y1 = max(0, y1 - PADS[0])
+    y2 = min(ih, y2 + PADS[1])
+    x1 = max(0, x1 - PADS[2])
+    x2 = min(iw, x2 + PADS[3])
+    
+    return (y1, y2, x1, x2)
+
+
+def audio_to_mel(audio_path=None, waveform=None):
+    """
+    Calcule le mel spectrogram Wav2Lip (16 kHz).
+    
+    Args:
+        audio_path: Fichier audio (utilisé si waveform est absent)
+        waveform: (optionnel) (wav float32, sample_rate) en mémoire
+    
+    Returns:
+        ndarray: Mel spectrogram (80 x T)
+    """
+    import sys
+    sys.path.append('/app/Wav2Lip')
+    
+    import audio as wav2lip_audio
+    
+    if waveform is not None:
+        wav = resample_audio(waveform[0], waveform[1], 16000)
+    else:
+        wav = wav2lip_audio.load_wav(audio_path, 16000)
+    
+    return wav2lip_audio.melspectrogram(wav)
+
+
+def get_mel_chunks(mel, fps=FPS, mel_step_size=MEL_STEP_SIZE):
+    """
+    Découpe le mel spectrogram en une fenêtre par frame vidéo.
+    
+    Les fenêtres sont prises dans une vue glissante (sans copie) du mel;
+    la dernière frame utilise les mel_step_size dernières colonnes.
+    
+    Args:
+        mel: Mel spectrogram (80 x T)
+        fps: Images par seconde de la vidéo
+        mel_step_size: Largeur d'une fenêtre mel
+    
+    Returns:
+        ndarray: Mel chunks (N, 80, mel_step_size) float32
+    """
+    import numpy as np
+    
+    # Segments très courts: compléter pour avoir au moins une fenêtre
+    if mel.shape[1] < mel_step_size:
+        mel = np.pad(mel, ((0, 0), (0, mel_step_size - mel.shape[1])), mode='edge')
+    
+    n_cols = mel.shape[1]
+    mel_idx_multiplier = 80. / fps
+    
+    # Vue (T - mel_step_size + 1, 80, mel_step_size) sur le mel
+    windows = np.lib.stride_tricks.sliding_window_view(mel, mel_step_size, axis=1).transpose(1, 0, 2)
+    
+    # Même indexation que Wav2Lip: int(i * 80 / fps) tant que la fenêtre tient, puis la fin
+    starts = (np.arange(int((n_cols - mel_step_size) / mel_idx_multiplier) + 2) * mel_idx_multiplier).astype(int)
+    starts = starts[starts + mel_step_size <= n_cols]
+    starts = np.append(starts, n_cols - mel_step_size)
+    
+    return windows[starts].astype(np.float32, copy=False)
+
+
+def align_mel_chunks(mel_chunks, n_frames):
+    """
+    Ajuste le nombre de fenêtres mel à n_frames.
+    
+    La dernière fenêtre est répétée s'il en manque, les fenêtres en trop
+    sont retirées.
+    
+    Args:
+        mel_chunks: Mel chunks (N, 80, mel_step_size)
+        n_frames: Nombre de frames voulu
+    
+    Returns:
+        ndarray: Mel chunks (max(n_frames, 0), 80, mel_step_size)
+    """
+    import numpy as np
+    
+    n_frames = max(n_frames, 0)
+    if len(mel_chunks) >= n_frames:
+        return mel_chunks[:n_frames]
+    padding = np.repeat(mel_chunks[-1:], n_frames - len(mel_chunks), axis=0)
+    return np.concatenate([mel_chunks, padding])
+
+
+def audio_frame_count(audio_path=None, waveform=None, fps=FPS):
+    """
+    Nombre de frames vidéo couvrant tout l'audio: round(durée × fps).
+    
+    get_mel_chunks en donne ~3 de moins; sans complément, -shortest
+    couperait la fin de l'audio (dernière syllabe) au multiplexage.
+    
+    Args:
+        audio_path: (optionnel) Fichier audio, lu si waveform est absent
+        waveform: (optionnel) (wav, sample_rate) en mémoire
+        fps: Images par seconde de la vidéo
+    
+    Returns:
+        int: Nombre de frames (au moins 1)
+    """
+    if waveform is not None:
+        wav, sample_rate = waveform
+        return max(1, round(len(wav) / sample_rate * fps))
+    
+    import soundfile as sf
+    info = sf.info(audio_path)
+    return max(1, round(info.frames / info.samplerate * fps))
+
+
+def timeline_mel_chunks(waveforms, fps=FPS):
+    """
+    Mel chunks phrase par phrase, calés sur la timeline de l'audio complet.
+    
+    get_mel_chunks donne quelques frames de moins que la durée d'un segment;
+    sur plusieurs phrases l'écart s'accumulerait (lèvres en avance sur la
+    voix). Chaque phrase k se termine donc à la frame
+    round(échantillons cumulés / sample_rate * fps).
+    
+    Args:
+        waveforms: Itérable de (wav float32, sample_rate), une par phrase
+        fps: Images par seconde de la vidéo
+    
+    Yields:
+        ndarray: Mel chunks de la phrase (éventuellement vide)
+    """
+    frames_done = 0
+    samples_done = 0
+    for wav, sample_rate in waveforms:
+        samples_done += len(wav)
+        end_frame = round(samples_done / sample_rate * fps)
+        mel_chunks = get_mel_chunks(audio_to_mel(waveform=(wav, sample_rate)), fps)
+        yield align_mel_chunks(mel_chunks, end_frame - frames_done)
+        frames_done = end_frame
+
+
+# Fondu des bords de la bouche collée (pixels, 0 = collage direct)
+MOUTH_BLEND_FEATHER = int(os.environ.get('MOUTH_BLEND_FEATHER', '0'))
+
+
+def feather_mask(height, width, feather):
+    """
+    Masque de fondu (1 au centre, rampe linéaire sur `feather` pixels aux bords).
+    
+    Args:
+        height: Hauteur de la région
+        width: Largeur de la région
+        feather: Largeur de la rampe en pixels
+    
+    Returns:
+        ndarray: Masque (height, width, 1) float32, ou None si feather <= 0
+    """
+    import numpy as np
+    
+    if feather <= 0:
+        return None
+    
+    ys = np.arange(height, dtype=np.float32)
+    xs = np.arange(width, dtype=np.float32)
+    dist_y = np.minimum(ys, height - 1 - ys)[:, None]
+    dist_x = np.minimum(xs, width - 1 - xs)[None, :]
+    mask = np.clip(np.minimum(dist_y, dist_x) / feather, 0., 1.)
+    
+    return mask[:, :, None]
+
+
+def composite_regions(pred, base_region, mask=None):
+    """
+    Compose un batch de régions prédites avec la région d'origine.
+    
+    Args:
+        pred: Prédictions redimensionnées (N, h, w, 3) dans [0, 255]
+        base_region: Région d'origine (h, w, 3) float32
+        mask: (optionnel) Masque de fondu (h, w, 1)
+    
+    Returns:
+        ndarray: Régions (N, h, w, 3) uint8
+    """
+    import numpy as np
+    
+    if mask is not None:
+        pred = base_region + (pred - base_region) * mask
+    
+    return np.clip(pred, 0, 255).astype(np.uint8)
+
+
+def render_lipsync(gen, model, device, out, out_frame, coords, feather=MOUTH_BLEND_FEATHER, timings=None):
+    """
+    Exécute Wav2Lip sur les batches et écrit les frames dans la vidéo.
+    
+    Le redimensionnement et le collage sont faits pour tout le batch à la
+    fois; par frame il ne reste que la copie de la région dans le buffer
+    de sortie et son envoi à l'encodeur.
+    
+    Args:
+        gen: Générateur de batches (img_batch, mel_batch)
+        model: Modèle Wav2Lip
+        device: 'cuda' ou 'cpu'
+        out: Encodeur vidéo (voir open_video_writer)
+        out_frame: Buffer de sortie (frame de base, réutilisé pour chaque frame)
+        coords: (y1, y2, x1, x2) de la région du visage
+        feather: Largeur du fondu des bords en pixels (0 = collage direct)
+        timings: (optionnel) JobTimings: inférence, compositing et encodage cumulés
+    
+    Returns:
+        int: Nombre de frames écrites
+    """
+    import numpy as np
+    
+    timings = timings or JobTimings(log=False)
+    y1, y2, x1, x2 = coords
+    n_frames = 0
+    
+    # Région de base et masque calculés une seule fois
+    base_region = out_frame[y1:y2, x1:x2].astype(np.float32)
+    mask = feather_mask(y2 - y1, x2 - x1, feather)
+    
+    for img_batch, mel_batch in gen:
+        with timings.span('wav2lip_inference', log=False, frames=len(img_batch)):
+            pred = predict_batch(model, device, img_batch, mel_batch, out_size=(x2 - x1, y2 - y1))
+        with timings.span('composite', log=False, frames=len(pred)):
+            regions = composite_regions(pred, base_region, mask)
+        
+        with timings.span('encode', log=False, frames=len(regions)):
+            for region in regions:
+                out_frame[y1:y2, x1:x2] = region
+                out.write(out_frame)
+        n_frames += len(regions)
+    
+    return n_frames
+
+
+# Attente maximale du résultat de détection avant de lancer la synthèse
+# (vide: attendre la fin de la détection, qui ne dépend pas de Wav2Lip)
+FACE_CHECK_WAIT = float(os.environ['FACE_CHECK_WAIT']) if os.environ.get('FACE_CHECK_WAIT') else None
+
+
+def start_face_preparation(image_path, timings=None):
+    """
+    Décode l'image et détecte le visage en arrière-plan.
+    
+    Lancé avant le TTS: la préparation de l'image se déroule pendant la
+    synthèse au lieu de s'y ajouter. Seul MediaPipe est initialisé ici,
+    les poids Wav2Lip sont chargés à l'étape vidéo.
+    
+    Returns:
+        Future: (frame, face_rect, coords), ou ValueError si aucun visage
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    timings = timings or JobTimings(log=False)
+    
+    def prepare():
+        face_detector = get_face_detector()
+        with timings.span('face_detection'):
+            return load_face(image_path, face_detector)
+    
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='face-prep')
+    future = executor.submit(prepare)
+    executor.shutdown(wait=False)
+    return future
+
+
+def face_abort_check(face_future, first_wait=None):
+    """
+    Construit la fonction `abort` du TTS à partir de la détection en cours.
+    
+    Le premier appel, avant tout appel au modèle TTS, attend la fin de la
+    détection (au plus FACE_CHECK_WAIT secondes si défini): une image sans
+    visage ne coûte donc aucune synthèse. Les suivants ne bloquent pas.
+    Lève JobAborted si l'image est illisible ou sans visage.
+    """
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+    
+    waits = [FACE_CHECK_WAIT if first_wait is None else first_wait]
+    
+    def check():
+        try:
+            face_future.result(timeout=waits.pop() if waits else 0)
+        except FutureTimeoutError:
+            return
+        except ValueError as e:
+            raise JobAborted(str(e)) from e
+        except Exception:
+            # Autre erreur (initialisation MediaPipe...): traitée à l'étape vidéo
+            return
+    
+    return check
+
+
+def generate_talking_head(image_path, audio_path, output_path, encode_options=None, waveform=None,
+                          face=None, timings=None):
+    """
+    Génère la vidéo talking head avec Wav2Lip.
+    
+    Args:
+        image_path: Chemin vers l'image
+        audio_path: Chemin vers l'audio (multiplexé dans la vidéo)
+        output_path: Chemin de sortie pour la vidéo
+        encode_options: (optionnel) {'preset': ..., 'crf': ...} pour ffmpeg
+        waveform: (optionnel) (wav, sample_rate) en mémoire, utilisé à la place
+            du fichier pour le mel et le multiplexage
+        face: (optionnel) (frame, face_rect, coords) déjà préparé (start_face_preparation)
+        timings: (optionnel) JobTimings recevant les spans de chaque étape
+    
+    Returns:
+        str: Chemin vers la vidéo générée
+    """
+    import sys
+    sys.path.append('/app/Wav2Lip')
+    
+    timings = timings or JobTimings(log=False)
+    print("   🎬 Initialisation Wav2Lip...")
     
     # Charger le modèle
     wav2lip_data = init_wav2lip_model()
@@ -313,266 +2894,1492 @@ def generate_talking_head(image_path, audio_path, output_path):
     device = wav2lip_data['device']
     face_detector = wav2lip_data['face_detector']
     
-    # Paramètres
-    mel_step_size = 16
-    img_size = 96
-    fps = 25
-    batch_size = 128
-    pads = [0, 10, 0, 0]  # top, bottom, left, right
+    if face is None:
+        with timings.span('face_detection'):
+            face = load_face(image_path, face_detector)
+    frame, face_rect, coords = face
     
-    print("   📸 Détection du visage...")
+    # Charger l'audio et calculer les mel spectrograms
+    print("   🎵 Traitement de l'audio...")
+    with timings.span('mel') as span:
+        mel = audio_to_mel(audio_path, waveform)
+        
+        # Une frame par 1/FPS s d'audio: la vidéo couvre tout l'audio
+        mel_chunks = align_mel_chunks(get_mel_chunks(mel), audio_frame_count(audio_path, waveform))
+        span['frames'] = len(mel_chunks)
     
-    # Charger l'image
-    if not path.isfile(image_path):
-        raise ValueError(f'Image non trouvée: {image_path}')
+    print(f"   📊 Génération de {len(mel_chunks)} frames...")
+    print("   🎭 Génération du lip-sync...")
     
-    # Créer une vidéo statique à partir de l'image
-    frame = cv2.imread(image_path)
+    # Mode image fixe: la frame et le visage 96x96 sont stockés une seule fois,
+    # les batches sont construits à la demande (mémoire ~ batch_size, pas ~ durée audio)
+    gen = datagen_static(face_rect, mel_chunks, IMG_SIZE, get_batch_size())
+    
+    frame_h, frame_w = frame.shape[:-1]
+    out = open_video_writer(output_path, FPS, (frame_w, frame_h), audio_path, encode_options, waveform)
+    
+    # Un seul buffer de sortie: seule la région du visage change d'une frame à l'autre
+    out_frame = frame.copy()
+    
+    with timings.span('lipsync') as span:
+        try:
+            span['frames'] = render_lipsync(gen, model, device, out, out_frame, coords, timings=timings)
+            span['video_seconds'] = span['frames'] / FPS
+        finally:
+            # Fin d'encodage: vidage du pipe ffmpeg et finalisation du MP4
+            with timings.span('encode', log=False):
+                out.release()
+    print(f"   ✅ Vidéo générée: {output_path}")
+    
+    return output_path
+
+
+class BatchVideoWriter:
+    """
+    Répartit un flux de frames entre plusieurs vidéos de sortie.
+    
+    Même interface que cv2.VideoWriter (write/release): les frames arrivent
+    dans l'ordre des items, chaque encodeur est ouvert à la première frame
+    de son item et fermé dès sa dernière frame.
+    """
+    
+    def __init__(self, output_paths, audio_paths, frame_counts, fps, frame_size, encode_options=None,
+                 waveforms=None):
+        self.items = list(zip(output_paths, audio_paths, frame_counts, waveforms or [None] * len(output_paths)))
+        self.fps = fps
+        self.frame_size = frame_size
+        self.encode_options = encode_options
+        self.index = 0
+        self.written = 0
+        self.writer = None
+    
+    def write(self, frame):
+        output_path, audio_path, frame_count, waveform = self.items[self.index]
+        if self.writer is None:
+            self.writer = open_video_writer(output_path, self.fps, self.frame_size, audio_path,
+                                            self.encode_options, waveform)
+        self.writer.write(frame)
+        self.written += 1
+        if self.written >= frame_count:
+            self.writer.release()
+            self.writer = None
+            self.written = 0
+            self.index += 1
+    
+    def release(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+def generate_talking_head_batch(image_path, audio_paths, output_paths, encode_options=None, waveforms=None,
+                                face=None, timings=None):
+    """
+    Génère plusieurs vidéos talking head pour la même image.
+    
+    Le visage est détecté une seule fois et les frames de tous les items
+    sont regroupées dans des batches Wav2Lip complets (get_batch_size()), y
+    compris à la frontière entre deux items.
+    
+    Args:
+        image_path: Chemin vers l'image partagée
+        audio_paths: Audio de chaque item
+        output_paths: Vidéo de sortie de chaque item
+        encode_options: (optionnel) {'preset': ..., 'crf': ...} pour ffmpeg
+        waveforms: (optionnel) (wav, sample_rate) en mémoire de chaque item
+        face: (optionnel) (frame, face_rect, coords) déjà préparé (start_face_preparation)
+        timings: (optionnel) JobTimings recevant les spans de chaque étape
+    
+    Returns:
+        list: Chemins des vidéos générées
+    """
+    import numpy as np
+    
+    timings = timings or JobTimings(log=False)
+    waveforms = waveforms or [None] * len(audio_paths)
+    
+    print(f"   🎬 Initialisation Wav2Lip (batch de {len(audio_paths)} items)...")
+    
+    wav2lip_data = init_wav2lip_model()
+    model = wav2lip_data['model']
+    device = wav2lip_data['device']
+    face_detector = wav2lip_data['face_detector']
+    
+    frame, face_rect, coords = face if face is not None else load_face(image_path, face_detector)
+    
+    print("   🎵 Traitement des audios...")
+    chunks_per_item = []
+    for audio_path, waveform in zip(audio_paths, waveforms):
+        chunks_per_item.append(align_mel_chunks(get_mel_chunks(audio_to_mel(audio_path, waveform)),
+                                                audio_frame_count(audio_path, waveform)))
+    
+    mel_chunks = np.concatenate(chunks_per_item)
+    print(f"   📊 Génération de {len(mel_chunks)} frames pour {len(audio_paths)} items...")
+    
+    gen = datagen_static(face_rect, mel_chunks, IMG_SIZE, get_batch_size())
+    
+    frame_h, frame_w = frame.shape[:-1]
+    out = BatchVideoWriter(output_paths, audio_paths, [len(c) for c in chunks_per_item],
+                           FPS, (frame_w, frame_h), encode_options, waveforms)
+    with timings.span('lipsync') as span:
+        try:
+            span['frames'] = render_lipsync(gen, model, device, out, frame.copy(), coords, timings=timings)
+            span['video_seconds'] = span['frames'] / FPS
+        finally:
+            with timings.span('encode', log=False):
+                out.release()
+    print(f"   ✅ {len(output_paths)} vidéos générées")
+    
+    return output_paths
+
+
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '2'))
+
+
+def _pipeline_stage(target, source, sink, errors):
+    """
+    Thread d'un étage du pipeline: consomme `source`, produit dans `sink`.
+    
+    Une erreur est mémorisée dans `errors` et la fin de flux (None) est
+    toujours propagée pour débloquer l'étage suivant.
+    """
+    try:
+        for item in target(source):
+            sink.put(item)
+    except Exception as e:
+        errors.append(e)
+        # Vider l'étage amont pour qu'il ne reste pas bloqué sur une queue pleine
+        if hasattr(source, 'get'):
+            for _ in _drain(source):
+                pass
+    finally:
+        sink.put(None)
+
+
+def _drain(q):
+    """Itère sur une queue jusqu'à la fin de flux (None)"""
+    while True:
+        item = q.get()
+        if item is None:
+            return
+        yield item
+
+
+class PipelineRenderError(Exception):
+    """Échec du pipeline après le début du rendu: pas de repli séquentiel (TTS déjà payé)"""
+
+
+def generate_talking_head_pipelined(image_path, text, language, voice, audio_path, output_path,
+                                    encode_options=None, timings=None):
+    """
+    Génère la vidéo talking head en pipeline phrase par phrase.
+    
+    La synthèse XTTS de la phrase N+1 se déroule pendant l'extraction mel
+    et l'inférence Wav2Lip de la phrase N. Les étages communiquent par des
+    queues bornées (PIPELINE_QUEUE_SIZE), la première frame est donc encodée
+    après une seule phrase au lieu de toute la synthèse.
+    
+    Args:
+        image_path: Chemin vers l'image
+        text: Texte à faire lire
+        language: Code langue
+        voice: Nom du speaker ou URL/chemin audio pour clonage
+        audio_path: Chemin de sortie pour l'audio complet (WAV)
+        output_path: Chemin de sortie pour la vidéo
+        encode_options: (optionnel) {'preset': ..., 'crf': ...} pour ffmpeg
+        timings: (optionnel) JobTimings: spans 'tts' et 'render' cumulés
+            phrase par phrase (les étages se chevauchent)
+    
+    Returns:
+        tuple: (output_path, audio_path)
+    
+    Raises:
+        PipelineRenderError: Échec une fois le rendu commencé (la synthèse
+            restante est annulée; un repli séquentiel refairait tout le TTS)
+    """
+    import sys
+    sys.path.append('/app/Wav2Lip')
+    
+    import time
+    import queue
+    import threading
+    import numpy as np
+    
+    timings = timings or JobTimings(log=False)
+    print("   🎬 Initialisation Wav2Lip (mode pipeline)...")
+    start_time = time.time()
+    
+    wav2lip_data = init_wav2lip_model()
+    model = wav2lip_data['model']
+    device = wav2lip_data['device']
+    face_detector = wav2lip_data['face_detector']
+    
+    with timings.span('face_detection'):
+        frame, face_rect, coords = load_face(image_path, face_detector)
+    
+    sentences = split_sentences(text)
+    if not sentences:
+        raise ValueError("Texte vide")
+    print(f"   ✂️  {len(sentences)} phrase(s) à synthétiser")
+    
+    speaker_kwargs = resolve_speaker_kwargs(voice, os.path.dirname(audio_path))
+    init_tts_model()
+    
+    # Étage 1: XTTS phrase par phrase (annulé si le rendu échoue)
+    stop = threading.Event()
+    
+    def tts_stage(items):
+        for sentence in items:
+            if stop.is_set():
+                return
+            print(f"   🎤 Phrase: '{sentence[:40]}...'")
+            with timings.span('tts', chars=len(sentence)) as span:
+                waveform = synthesize_waveform(sentence, language, speaker_kwargs)
+                span['audio_seconds'] = len(waveform[0]) / waveform[1]
+            yield waveform
+    
+    # Étage 2: rééchantillonnage 16 kHz + mel chunks (calés sur la timeline de l'audio complet)
+    waveforms = []
+    
+    def mel_stage(items):
+        def collect():
+            for waveform in _drain(items):
+                waveforms.append(waveform)
+                yield waveform
+        
+        for mel_chunks in timeline_mel_chunks(collect()):
+            if len(mel_chunks):
+                yield mel_chunks
+    
+    audio_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    mel_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    errors = []
+    
+    threads = [
+        threading.Thread(target=_pipeline_stage, args=(tts_stage, sentences, audio_queue, errors), daemon=True),
+        threading.Thread(target=_pipeline_stage, args=(mel_stage, audio_queue, mel_queue, errors), daemon=True),
+    ]
+    for t in threads:
+        t.start()
+    
+    # Étage 3 (thread principal): Wav2Lip + écriture vidéo
+    # L'audio n'est complet qu'à la fin: vidéo encodée seule puis audio multiplexé (sans réencodage)
+    import shutil
+    use_ffmpeg = shutil.which('ffmpeg') is not None
+    video_only_path = output_path + '.video.mp4' if use_ffmpeg else output_path
+    frame_h, frame_w = frame.shape[:-1]
+    out = open_video_writer(video_only_path, FPS, (frame_w, frame_h), None, encode_options)
+    out_frame = frame.copy()
+    n_frames = 0
+    drained = False
+    
+    try:
+        try:
+            for mel_chunks in _drain(mel_queue):
+                gen = datagen_static(face_rect, mel_chunks, IMG_SIZE, get_batch_size())
+                # Buffer repartant de la frame d'origine (région de base pour le fondu)
+                out_frame[:] = frame
+                with timings.span('render') as span:
+                    written = render_lipsync(gen, model, device, out, out_frame, coords, timings=timings)
+                    span['frames'] = written
+                    span['video_seconds'] = written / FPS
+                if n_frames == 0 and written:
+                    print(f"   ⏱️  Première frame encodée après {time.time() - start_time:.2f}s")
+                n_frames += written
+            drained = True
+        finally:
+            with timings.span('encode', log=False):
+                out.release()
+    except Exception as e:
+        # Annuler la synthèse restante et débloquer les étages amont
+        stop.set()
+        if not drained:
+            for _ in _drain(mel_queue):
+                pass
+        raise PipelineRenderError(f"Rendu pipeline interrompu: {e}") from e
+    finally:
+        for t in threads:
+            t.join()
+    
+    if errors:
+        if n_frames:
+            raise PipelineRenderError(f"Synthèse interrompue en cours de rendu: {errors[0]}") from errors[0]
+        raise errors[0]
+    
+    # Audio complet pour la réponse
+    try:
+        sample_rate = waveforms[0][1]
+        write_wav(audio_path, (np.concatenate([w for w, _ in waveforms]), sample_rate))
+        
+        if use_ffmpeg:
+            with timings.span('encode', log=False):
+                mux_audio(video_only_path, audio_path, output_path)
+            os.remove(video_only_path)
+    except Exception as e:
+        raise PipelineRenderError(f"Finalisation pipeline impossible: {e}") from e
+    
+    print(f"   ✅ Vidéo générée ({n_frames} frames, {time.time() - start_time:.2f}s): {output_path}")
+    
+    return output_path, audio_path
+
+
+class BatchBuffers:
+    """
+    Buffers d'entrée Wav2Lip préalloués (float32, NCHW).
+    
+    Les batches sont écrits en place dans ces buffers et passés à torch
+    sans copie (torch.from_numpy). Sur GPU la mémoire est épinglée pour
+    accélérer le transfert vers le device.
+    """
+    
+    def __init__(self, batch_size):
+        pin_memory = torch.cuda.is_available()
+        self.batch_size = batch_size
+        self.img = torch.empty((batch_size, 6, IMG_SIZE, IMG_SIZE), dtype=torch.float32,
+                               pin_memory=pin_memory).numpy()
+        self.mel = torch.empty((batch_size, 1, 80, MEL_STEP_SIZE), dtype=torch.float32,
+                               pin_memory=pin_memory).numpy()
+
+
+# Pool de buffers réutilisés d'un batch et d'un job à l'autre
+BATCH_BUFFERS_POOL = []
+BATCH_BUFFERS_POOL_SIZE = max(2, MAX_CONCURRENT_JOBS)
+BATCH_BUFFERS_LOCK = threading.Lock()
+
+
+@contextmanager
+def batch_buffers(batch_size):
+    """Emprunte des buffers de batch au pool (créés si nécessaire)"""
+    buffers = None
+    with BATCH_BUFFERS_LOCK:
+        for i, candidate in enumerate(BATCH_BUFFERS_POOL):
+            if candidate.batch_size == batch_size:
+                buffers = BATCH_BUFFERS_POOL.pop(i)
+                break
+    if buffers is None:
+        buffers = BatchBuffers(batch_size)
+    
+    try:
+        yield buffers
+    finally:
+        with BATCH_BUFFERS_LOCK:
+            BATCH_BUFFERS_POOL.append(buffers)
+            del BATCH_BUFFERS_POOL[:-BATCH_BUFFERS_POOL_SIZE]
+
+
+def fill_face_input(dest, face):
+    """
+    Écrit l'entrée 6 canaux Wav2Lip d'un visage dans un buffer, sans temporaire float64.
+    
+    Args:
+        dest: Vue (6, 96, 96) float32 du buffer de batch
+        face: Visage redimensionné (96, 96, 3) BGR uint8
+    """
+    import numpy as np
+    
+    # Canaux 3-5: visage de référence normalisé dans [-1, 1]
+    reference = dest[3:]
+    np.multiply(face.transpose(2, 0, 1), np.float32(2. / 255.), out=reference,
+                dtype=np.float32, casting='unsafe')
+    reference -= np.float32(1.)
+    
+    # Canaux 0-2: même visage avec la moitié basse masquée (0 → -1 après normalisation)
+    dest[:3] = reference
+    dest[:3, face.shape[0] // 2:] = -1.
+
+
+def datagen_static(face, mels, img_size, batch_size):
+    """
+    Générateur de batches pour Wav2Lip à partir d'une image fixe.
+    
+    Le visage est redimensionné et normalisé une seule fois dans les
+    buffers préalloués; pour chaque batch seuls les mel chunks sont
+    recopiés. La mémoire utilisée dépend de batch_size et non de la durée
+    de l'audio.
+    
+    Args:
+        face: Région du visage (BGR, uint8)
+        mels: Mel chunks (N, 80, mel_step_size) (voir get_mel_chunks)
+        img_size: Taille d'entrée du modèle (96)
+        batch_size: Nombre de frames par batch
+    
+    Yields:
+        tuple: (img_batch, mel_batch) float32 NCHW, vues sur des buffers
+            réutilisés (valables jusqu'au batch suivant)
+    """
+    import cv2
+    
+    face = cv2.resize(face, (img_size, img_size))
+    
+    with batch_buffers(batch_size) as buffers:
+        # Visage identique pour toutes les frames: rempli une seule fois
+        fill_face_input(buffers.img[0], face)
+        buffers.img[1:] = buffers.img[0]
+        
+        for start in range(0, len(mels), batch_size):
+            chunk = mels[start:start + batch_size]
+            buffers.mel[:len(chunk), 0] = chunk
+            
+            yield buffers.img[:len(chunk)], buffers.mel[:len(chunk)]
+
+
+def datagen(tracked_frames, mels, img_size, batch_size):
+    """
+    Générateur de batches pour Wav2Lip à partir d'un flux de frames.
+    
+    Args:
+        tracked_frames: Itérable de (frame, coords) (voir track_faces)
+        mels: Liste des mel chunks (80 x mel_step_size)
+        img_size: Taille d'entrée du modèle (96)
+        batch_size: Nombre de frames par batch
+    
+    Yields:
+        tuple: (img_batch, mel_batch, frames, coords), img_batch et
+            mel_batch étant des vues float32 NCHW sur des buffers réutilisés
+    """
+    import cv2
     
-    if frame is None:
-        raise ValueError(f"Impossible de charger l'image: {image_path}")
+    with batch_buffers(batch_size) as buffers:
+        frame_batch, coords_batch = [], []
+        
+        for m, (frame, coords) in zip(mels, tracked_frames):
+            k = len(frame_batch)
+            y1, y2, x1, x2 = coords
+            face = cv2.resize(frame[y1:y2, x1:x2], (img_size, img_size))
+            
+            fill_face_input(buffers.img[k], face)
+            buffers.mel[k, 0] = m
+            frame_batch.append(frame)
+            coords_batch.append(coords)
+            
+            if len(frame_batch) >= batch_size:
+                yield buffers.img[:batch_size], buffers.mel[:batch_size], frame_batch, coords_batch
+                frame_batch, coords_batch = [], []
+        
+        if frame_batch:
+            n = len(frame_batch)
+            yield buffers.img[:n], buffers.mel[:n], frame_batch, coords_batch
+
+
+# Mode vidéo pilote: détection éparse + suivi du visage
+FACE_DETECT_EVERY = int(os.environ.get('FACE_DETECT_EVERY', '5'))
+FACE_SMOOTHING = float(os.environ.get('FACE_SMOOTHING', '0.5'))
+FACE_SEARCH_MAX_FRAMES = 250
+
+
+def iter_video_frames(video_path, n_frames):
+    """
+    Décode la vidéo en flux, sans la charger entièrement en mémoire.
     
-    # Charger l'audio et calculer les mel spectrograms
-    print("   🎵 Traitement de l'audio...")
-    wav = wav2lip_audio.load_wav(audio_path, 16000)
-    mel = wav2lip_audio.melspectrogram(wav)
+    La vidéo est rebouclée si l'audio est plus long qu'elle.
     
-    # Calculer le nombre de frames nécessaires
-    mel_chunks = []
-    mel_idx_multiplier = 80. / fps
-    i = 0
-    while True:
-        start_idx = int(i * mel_idx_multiplier)
-        if start_idx + mel_step_size > len(mel[0]):
-            mel_chunks.append(mel[:, len(mel[0]) - mel_step_size:])
-            break
-        mel_chunks.append(mel[:, start_idx: start_idx + mel_step_size])
-        i += 1
+    Args:
+        video_path: Chemin vers la vidéo
+        n_frames: Nombre de frames à produire
     
-    print(f"   📊 Génération de {len(mel_chunks)} frames...")
+    Yields:
+        ndarray: Frames BGR
+    """
+    import cv2
     
-    # Créer les frames de l'image répétées
-    full_frames = [frame.copy() for _ in range(len(mel_chunks))]
+    cap = cv2.VideoCapture(video_path)
+    try:
+        produced = 0
+        while produced < n_frames:
+            ok, frame = cap.read()
+            if not ok:
+                if produced == 0:
+                    raise ValueError(f"Impossible de lire la vidéo: {video_path}")
+                # Reboucler au début de la vidéo
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = cap.read()
+                if not ok:
+                    break
+            yield frame
+            produced += 1
+    finally:
+        cap.release()
+
+
+def track_faces(frames, face_detector, detect_every=FACE_DETECT_EVERY, smoothing=FACE_SMOOTHING):
+    """
+    Associe une boîte de visage à chaque frame en ne détectant que toutes les N frames.
     
-    # Détecter les visages avec MediaPipe
-    print("   👤 Détection des visages...")
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = face_detector.process(rgb_frame)
+    Entre deux détections les boîtes sont interpolées linéairement, puis
+    lissées (moyenne exponentielle) pour éviter le tremblement. Seules les
+    frames situées entre deux détections sont gardées en mémoire.
     
-    if not results.detections:
-        raise ValueError("Aucun visage détecté dans l'image")
+    Args:
+        frames: Itérable de frames BGR
+        face_detector: Détecteur MediaPipe
+        detect_every: Intervalle de détection (en frames)
+        smoothing: Poids de l'historique dans le lissage (0 = aucun)
     
-    # Utiliser le premier visage détecté
-    detection = results.detections[0]
-    bboxC = detection.location_data.relative_bounding_box
-    ih, iw, _ = frame.shape
+    Yields:
+        tuple: (frame, coords) avec coords = (y1, y2, x1, x2)
+    """
+    import numpy as np
     
-    # Convertir les coordonnées relatives en pixels
-    x1 = int(bboxC.xmin * iw)
-    y1 = int(bboxC.ymin * ih)
-    w = int(bboxC.width * iw)
-    h = int(bboxC.height * ih)
-    x2 = x1 + w
-    y2 = y1 + h
+    pending = []
+    prev_box = None
+    smoothed = None
     
-    # Appliquer les paddings
-    y1 = max(0, y1 - pads[0])
-    y2 = min(ih, y2 + pads[1])
-    x1 = max(0, x1 - pads[2])
-    x2 = min(iw, x2 + pads[3])
+    def emit(frame, box):
+        nonlocal smoothed
+        smoothed = box if smoothed is None else smoothing * smoothed + (1 - smoothing) * box
+        ih, iw = frame.shape[:2]
+        y1, y2, x1, x2 = np.round(smoothed).astype(int)
+        y1, x1 = max(0, y1), max(0, x1)
+        y2, x2 = min(ih, max(y2, y1 + 1)), min(iw, max(x2, x1 + 1))
+        return frame, (y1, y2, x1, x2)
     
-    # Extraire la région du visage
-    face_rect = frame[y1:y2, x1:x2]
+    for i, frame in enumerate(frames):
+        if i % detect_every != 0:
+            pending.append(frame)
+            continue
+        
+        coords = detect_face_box(frame, face_detector)
+        box = np.asarray(coords, dtype=np.float32) if coords is not None else prev_box
+        
+        if box is None:
+            # Pas encore de visage: attendre la prochaine détection (borné)
+            pending.append(frame)
+            if len(pending) > FACE_SEARCH_MAX_FRAMES:
+                raise ValueError("Aucun visage détecté dans la vidéo")
+            continue
+        
+        # Interpoler les frames en attente entre la détection précédente et celle-ci
+        start = prev_box if prev_box is not None else box
+        n = len(pending)
+        for j, pending_frame in enumerate(pending):
+            t = (j + 1) / (n + 1)
+            yield emit(pending_frame, start + (box - start) * t)
+        pending = []
+        
+        yield emit(frame, box)
+        prev_box = box
     
-    # Créer face_det_results pour chaque frame (même visage)
-    coords = (y1, y2, x1, x2)
-    face_det_results = [(face_rect.copy(), coords) for _ in range(len(full_frames))]
+    if pending:
+        if prev_box is None:
+            raise ValueError("Aucun visage détecté dans la vidéo")
+        for pending_frame in pending:
+            yield emit(pending_frame, prev_box)
+
+
+def render_lipsync_frames(gen, model, device, out):
+    """
+    Exécute Wav2Lip sur des batches de frames distinctes et écrit la vidéo.
     
-    print("   🎭 Génération du lip-sync...")
+    Args:
+        gen: Générateur (img_batch, mel_batch, frames, coords) (voir datagen)
+        model: Modèle Wav2Lip
+        device: 'cuda' ou 'cpu'
+        out: Encodeur vidéo (voir open_video_writer)
     
-    # Générer la vidéo avec lip-sync
-    gen = datagen(full_frames.copy(), mel_chunks, face_det_results, img_size, batch_size)
+    Returns:
+        int: Nombre de frames écrites
+    """
+    import cv2
+    import numpy as np
     
-    frame_h, frame_w = full_frames[0].shape[:-1]
-    out = cv2.VideoWriter(output_path, 
-                         cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_w, frame_h))
+    n_frames = 0
     
-    for i, (img_batch, mel_batch, frames, coords) in enumerate(gen):
-        img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(device)
-        mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(device)
-        
-        with torch.no_grad():
-            pred = model(mel_batch, img_batch)
-        
-        pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
+    for img_batch, mel_batch, frames, coords in gen:
+        pred = predict_batch(model, device, img_batch, mel_batch)
         
         for p, f, c in zip(pred, frames, coords):
             y1, y2, x1, x2 = c
             p = cv2.resize(p.astype(np.uint8), (x2 - x1, y2 - y1))
             f[y1:y2, x1:x2] = p
             out.write(f)
+            n_frames += 1
+    
+    return n_frames
+
+
+def generate_talking_head_video(video_path, audio_path, output_path, detect_every=FACE_DETECT_EVERY,
+                                encode_options=None, waveform=None, timings=None):
+    """
+    Génère la vidéo talking head à partir d'une vidéo pilote.
+    
+    Les frames sont décodées en flux, le visage est détecté toutes les
+    `detect_every` frames et suivi entre deux détections.
+    
+    Args:
+        video_path: Chemin vers la vidéo pilote
+        audio_path: Chemin vers l'audio
+        output_path: Chemin de sortie pour la vidéo
+        detect_every: Intervalle de détection du visage (en frames)
+        encode_options: (optionnel) {'preset': ..., 'crf': ...} pour ffmpeg
+        waveform: (optionnel) (wav, sample_rate) en mémoire
+        timings: (optionnel) JobTimings recevant les spans de chaque étape
+    
+    Returns:
+        str: Chemin vers la vidéo générée
+    """
+    import cv2
+    
+    timings = timings or JobTimings(log=False)
+    print("   🎬 Initialisation Wav2Lip (mode vidéo)...")
+    
+    wav2lip_data = init_wav2lip_model()
+    model = wav2lip_data['model']
+    device = wav2lip_data['device']
+    face_detector = wav2lip_data['face_detector']
+    
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or FPS
+    frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    
+    if frame_w == 0 or frame_h == 0:
+        raise ValueError(f"Impossible de lire la vidéo: {video_path}")
+    
+    print("   🎵 Traitement de l'audio...")
+    mel_chunks = align_mel_chunks(get_mel_chunks(audio_to_mel(audio_path, waveform), fps),
+                                  audio_frame_count(audio_path, waveform, fps))
+    
+    print(f"   📊 Génération de {len(mel_chunks)} frames ({fps:.2f} fps, détection toutes les {detect_every} frames)...")
     
-    out.release()
+    frames = iter_video_frames(video_path, len(mel_chunks))
+    tracked = track_faces(frames, face_detector, detect_every)
+    gen = datagen(tracked, mel_chunks, IMG_SIZE, get_batch_size())
+    
+    out = open_video_writer(output_path, fps, (frame_w, frame_h), audio_path, encode_options, waveform)
+    with timings.span('lipsync') as span:
+        try:
+            span['frames'] = render_lipsync_frames(gen, model, device, out)
+            span['video_seconds'] = span['frames'] / fps
+        finally:
+            with timings.span('encode', log=False):
+                out.release()
     print(f"   ✅ Vidéo générée: {output_path}")
     
     return output_path
 
 
-def datagen(frames, mels, face_det_results, img_size, batch_size):
-    """Générateur de batches pour Wav2Lip"""
-    img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
+# Cache des résultats adressé par contenu (image/vidéo + entrées normalisées)
+RESULT_CACHE_DIR = os.environ.get(
+    'RESULT_CACHE_DIR',
+    os.path.join(TEMP_DIR, 'result_cache')
+)
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_MB', '2048')) * 1024 * 1024
+RESULT_CACHE_STATS = {'hits': 0, 'misses': 0}
+RESULT_CACHE_LOCK = threading.Lock()
+
+
+def result_cache_key(image_path, text, language, voice, options=None):
+    """
+    Calcule la clé de cache d'un job talking head.
     
-    for i, m in enumerate(mels):
-        idx = i % len(frames)
-        frame_to_save = frames[idx].copy()
-        face, coords = face_det_results[idx]
-        face = face.copy()  # Copier le numpy array
-        
-        face = cv2.resize(face, (img_size, img_size))
-        
-        img_batch.append(face)
-        mel_batch.append(m)
-        frame_batch.append(frame_to_save)
-        coords_batch.append(coords)
+    Args:
+        image_path: Chemin de l'image décodée (hashée octet par octet)
+        text: Texte à lire
+        language: Code langue
+        voice: Speaker, voice_id ou URL de clonage
+        options: (optionnel) Autres paramètres qui influencent le rendu
+    
+    Returns:
+        str: Hash SHA-256 hexadécimal
+    """
+    import hashlib
+    
+    h = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    
+    normalized = {
+        'text': ' '.join(text.split()),
+        'language': language.strip().lower(),
+        'voice': voice.strip(),
+        'options': options or {},
+    }
+    h.update(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    
+    return h.hexdigest()
+
+
+def result_cache_get(key):
+    """
+    Cherche un résultat en cache et met à jour les compteurs hit/miss.
+    
+    Args:
+        key: Clé retournée par result_cache_key
+    
+    Returns:
+        dict: {'video_path', 'audio_path'} ou None
+    """
+    entry_dir = os.path.join(RESULT_CACHE_DIR, key)
+    video_path = os.path.join(entry_dir, 'output_video.mp4')
+    audio_path = os.path.join(entry_dir, 'speech.wav')
+    
+    with RESULT_CACHE_LOCK:
+        if RESULT_CACHE_MAX_BYTES > 0 and os.path.isfile(video_path) and os.path.isfile(audio_path):
+            RESULT_CACHE_STATS['hits'] += 1
+            # Marquer l'entrée comme récemment utilisée (LRU)
+            os.utime(entry_dir)
+            return {'video_path': video_path, 'audio_path': audio_path}
+        RESULT_CACHE_STATS['misses'] += 1
+        return None
+
+
+def result_cache_put(key, video_path, audio_path):
+    """
+    Stocke la vidéo et l'audio d'un job, puis applique l'éviction LRU.
+    
+    Args:
+        key: Clé retournée par result_cache_key
+        video_path: Vidéo générée
+        audio_path: Audio généré
+    """
+    import shutil
+    
+    if RESULT_CACHE_MAX_BYTES <= 0:
+        return
+    
+    entry_dir = os.path.join(RESULT_CACHE_DIR, key)
+    tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+    
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        shutil.copyfile(video_path, os.path.join(tmp_dir, 'output_video.mp4'))
+        shutil.copyfile(audio_path, os.path.join(tmp_dir, 'speech.wav'))
+        with RESULT_CACHE_LOCK:
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            else:
+                os.replace(tmp_dir, entry_dir)
+            _result_cache_evict()
+    except OSError as e:
+        print(f"   ⚠️  Cache résultat non écrit: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _result_cache_evict():
+    """Supprime les entrées les moins récemment utilisées au-delà de RESULT_CACHE_MAX_BYTES"""
+    import shutil
+    
+    entries = []
+    total = 0
+    for name in os.listdir(RESULT_CACHE_DIR):
+        entry_dir = os.path.join(RESULT_CACHE_DIR, name)
+        if name.endswith('.tmp') or not os.path.isdir(entry_dir):
+            continue
+        size = sum(
+            os.path.getsize(os.path.join(entry_dir, f))
+            for f in os.listdir(entry_dir)
+        )
+        entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+        total += size
+    
+    for _, size, entry_dir in sorted(entries):
+        if total <= RESULT_CACHE_MAX_BYTES:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        print(f"   🧹 Cache résultat: éviction de {os.path.basename(entry_dir)[:12]}")
+
+
+# Stockage objet compatible S3 (AWS, MinIO, R2...): activé si S3_BUCKET est défini
+S3_BUCKET = os.environ.get('S3_BUCKET')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+S3_REGION = os.environ.get('S3_REGION')
+S3_PREFIX = os.environ.get('S3_PREFIX', 'talking-head/')
+S3_URL_EXPIRES = int(os.environ.get('S3_URL_EXPIRES', '3600'))
+S3_MULTIPART_CHUNK_MB = int(os.environ.get('S3_MULTIPART_CHUNK_MB', '8'))
+S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY', '4'))
+
+S3_CLIENT = None
+S3_CLIENT_LOCK = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Crée (une seule fois) le client S3 partagé.
+    
+    La création d'un client boto3 depuis la session par défaut n'est pas
+    thread-safe: les threads d'upload et les jobs concurrents passent par
+    un verrou au premier appel. Le client lui-même est thread-safe.
+    """
+    global S3_CLIENT
+    
+    if S3_CLIENT is not None:
+        return S3_CLIENT
+    
+    with S3_CLIENT_LOCK:
+        if S3_CLIENT is None:
+            import boto3
+            from botocore.config import Config
+            
+            S3_CLIENT = boto3.client(
+                's3',
+                endpoint_url=S3_ENDPOINT_URL or None,
+                region_name=S3_REGION or None,
+                config=Config(
+                    signature_version='s3v4',
+                    max_pool_connections=max(10, 2 * S3_MAX_CONCURRENCY),
+                    retries={'max_attempts': 5, 'mode': 'standard'},
+                ),
+            )
+    return S3_CLIENT
+
+
+def upload_to_storage(file_path, key=None, content_type=None, skip_if_exists=False):
+    """
+    Upload un fichier vers le stockage objet et retourne une URL présignée.
+    
+    Les gros fichiers sont envoyés en multipart (parts de S3_MULTIPART_CHUNK_MB
+    envoyées en parallèle par S3_MAX_CONCURRENCY threads), en lisant le
+    fichier en flux sans le charger en mémoire.
+    
+    Args:
+        file_path: Chemin local du fichier
+        key: (optionnel) Clé objet (default: S3_PREFIX + uuid + nom du fichier)
+        content_type: (optionnel) Content-Type de l'objet
+        skip_if_exists: Ne pas réuploader si la clé existe déjà (clés adressées par contenu)
+    
+    Returns:
+        str: URL présignée (ou file:// si aucun bucket n'est configuré)
+    """
+    if not S3_BUCKET:
+        return f"file://{file_path}"
+    
+    import uuid
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+    
+    if key is None:
+        key = f"{S3_PREFIX}{uuid.uuid4().hex}/{os.path.basename(file_path)}"
+    
+    client = get_s3_client()
+    
+    exists = False
+    if skip_if_exists:
+        try:
+            client.head_object(Bucket=S3_BUCKET, Key=key)
+            exists = True
+        except ClientError:
+            exists = False
+    
+    if not exists:
+        chunk_size = S3_MULTIPART_CHUNK_MB * 1024 * 1024
+        transfer_config = TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            max_concurrency=S3_MAX_CONCURRENCY,
+            use_threads=True,
+        )
+        extra_args = {'ContentType': content_type} if content_type else None
+        client.upload_file(file_path, S3_BUCKET, key, ExtraArgs=extra_args, Config=transfer_config)
+        print(f"   ☁️  Upload: s3://{S3_BUCKET}/{key} ({os.path.getsize(file_path)} bytes)")
+    
+    return client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': S3_BUCKET, 'Key': key},
+        ExpiresIn=S3_URL_EXPIRES,
+    )
+
+
+def build_media_outputs(video_path=None, audio_path=None, key_prefix=None, skip_if_exists=False,
+                        audio_options=None, waveform=None):
+    """
+    Prépare les champs média de la réponse.
+    
+    Avec un bucket configuré, les fichiers sont uploadés en parallèle et la
+    réponse contient des URLs (video_url/audio_url). Sinon, ils sont
+    encodés en base64 (video_base64/audio_base64).
+    
+    Args:
+        video_path: (optionnel) Vidéo générée
+        audio_path: (optionnel) Audio généré (WAV)
+        key_prefix: (optionnel) Préfixe des clés objet
+        skip_if_exists: Ne pas réuploader les objets déjà présents
+        audio_options: (optionnel) {'format', 'sample_rate'} de l'audio retourné (voir parse_audio_options)
+        waveform: (optionnel) (wav, sample_rate) en mémoire, évite de relire audio_path
+    
+    Returns:
+        dict: Champs *_url ou *_base64 et *_size_bytes
+    """
+    if audio_path and audio_options is not None:
+        import shutil
         
-        if len(img_batch) >= batch_size:
-            img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch)
-            img_batch = (img_batch / 255.) * 2 - 1
-            mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], 80, -1])
+        # Audio réencodé dans un répertoire éphémère, supprimé une fois envoyé
+        encode_dir = make_temp_dir(prefix='encode')
+        try:
+            if waveform is None:
+                import soundfile as sf
+                wav, sr = sf.read(audio_path, dtype='float32')
+                waveform = (wav, sr)
+            audio_format = audio_options['format']
+            extension = AUDIO_FORMATS[audio_format][0]
+            encoded_path = os.path.join(encode_dir, Path(audio_path).stem + extension)
+            sample_rate = encode_audio(waveform, encoded_path, audio_format, audio_options.get('sample_rate'))
             
-            yield img_batch, mel_batch, frame_batch, coords_batch
-            img_batch, mel_batch, frame_batch, coords_batch = [], [], [], []
+            # Format, fréquence et débit dans le nom (clé objet): pas de collision
+            # entre encodages d'un même résultat en cache (skip_if_exists)
+            variant = [audio_format, str(sample_rate)]
+            if audio_format in AUDIO_OUTPUT_BITRATES:
+                variant.append(AUDIO_OUTPUT_BITRATES[audio_format])
+            variant_path = os.path.join(encode_dir, f"{Path(audio_path).stem}_{'_'.join(variant)}{extension}")
+            os.replace(encoded_path, variant_path)
+            outputs = build_media_outputs(video_path, variant_path, key_prefix, skip_if_exists)
+        finally:
+            shutil.rmtree(encode_dir, ignore_errors=True)
+        outputs.update({'audio_format': audio_format, 'audio_sample_rate': sample_rate})
+        return outputs
+    
+    audio_type = 'audio/wav'
+    if audio_path:
+        audio_type = next((mime for ext, mime in AUDIO_FORMATS.values()
+                           if audio_path.endswith(ext)), audio_type)
+    files = [
+        ('video', video_path, 'video/mp4'),
+        ('audio', audio_path, audio_type),
+    ]
+    files = [f for f in files if f[1]]
+    
+    outputs = {}
+    for name, file_path, _ in files:
+        outputs[f'{name}_size_bytes'] = os.path.getsize(file_path)
     
-    if len(img_batch) > 0:
-        img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch)
-        img_batch = (img_batch / 255.) * 2 - 1
-        mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], 80, -1])
+    if S3_BUCKET:
+        from concurrent.futures import ThreadPoolExecutor
         
-        yield img_batch, mel_batch, frame_batch, coords_batch
+        with ThreadPoolExecutor(max_workers=len(files) or 1) as pool:
+            futures = {}
+            for name, file_path, content_type in files:
+                key = f"{key_prefix}/{os.path.basename(file_path)}" if key_prefix else None
+                futures[name] = pool.submit(upload_to_storage, file_path, key, content_type, skip_if_exists)
+            for name, future in futures.items():
+                outputs[f'{name}_url'] = future.result()
+    else:
+        for name, file_path, _ in files:
+            with open(file_path, 'rb') as f:
+                outputs[f'{name}_base64'] = base64.b64encode(f.read()).decode('utf-8')
+    
+    for name, _, _ in files:
+        print(f"   ✓ {name.capitalize()} prêt(e): {outputs[f'{name}_size_bytes']} bytes")
+    
+    return outputs
 
 
-def upload_to_storage(video_path):
+def handle_batch(job_input, event, workspace=None, timings=None):
     """
-    Upload la vidéo vers un stockage (S3, etc.).
+    Traite un job batch: plusieurs textes pour une même image.
     
     Args:
-        video_path: Chemin local de la vidéo
+        job_input: Entrée du job avec 'image' et 'items' (liste de
+            {'text', 'voice', 'language'}); 'voice' et 'language' au niveau
+            du job servent de valeurs par défaut
+        event: Événement RunPod (pour l'identifiant du job)
+        workspace: (optionnel) JobWorkspace du job
+        timings: (optionnel) JobTimings du job (spans cumulés sur les items)
     
     Returns:
-        str: URL publique de la vidéo
+        dict: Résultat global avec un résultat par item dans 'items'
     """
-    # TODO: Implémenter l'upload vers S3 ou autre
-    return f"file://{video_path}"
+    import shutil
+    import uuid
+    
+    items = job_input['items']
+    if not isinstance(items, list) or not items:
+        return {'error': 'Le champ "items" doit être une liste non vide'}
+    if 'image' not in job_input:
+        return {'error': 'Le champ "image" est requis (URL ou base64)'}
+    
+    default_language = job_input.get('language', 'fr')
+    default_voice = job_input.get('voice', 'Claribel Dervla')
+    use_cache = job_input.get('cache', True)
+    encode_options = {
+        'preset': job_input.get('video_preset', VIDEO_PRESET),
+        'crf': int(job_input.get('video_crf', VIDEO_CRF)),
+    }
+    audio_options = parse_audio_options(job_input)
+    job_prefix = f"{S3_PREFIX}{event.get('id') or uuid.uuid4().hex}"
+    
+    timings = timings or JobTimings(event.get('id'))
+    
+    print(f"📥 Traitement batch: {len(items)} items")
+    
+    # Étape 1: Télécharger/décoder l'image (une seule fois) et les voix de référence
+    print("1️⃣ Téléchargement de l'image...")
+    with timings.span('download') as span:
+        (image_path, image_temp_dir), voice_ids = fetch_inputs(
+            lambda: download_image(job_input['image'], workspace),
+            [default_voice] + [item.get('voice') for item in items if isinstance(item, dict)]
+        )
+        span['bytes'] = os.path.getsize(image_path)
+    print(f"   ✓ Image sauvegardée: {image_path}")
+    
+    results = [None] * len(items)
+    pending = []
+    temp_dirs = [image_temp_dir]
+    face_future = None
+    
+    try:
+        # Étape 2: Synthèse de tous les items (modèle XTTS chaud)
+        print("2️⃣ Génération des audios (Coqui TTS XTTS_v2)...")
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[i] = {'index': i, 'success': False,
+                              'error': 'Chaque item doit être un objet {text, voice, language}'}
+                continue
+            text = item.get('text')
+            language = item.get('language', default_language)
+            voice = item.get('voice', default_voice)
+            voice = voice_ids.get(voice, voice)
+            base = {'index': i, 'speaker': voice, 'language': language}
+            
+            if not text:
+                results[i] = {**base, 'success': False, 'error': 'Le champ "text" est requis'}
+                continue
+            base['text_length'] = len(text)
+            
+            cache_key = None
+            if use_cache:
+                with timings.span('cache_lookup', log=False):
+                    cache_key = result_cache_key(image_path, text, language, voice, dict(encode_options))
+                    cached = result_cache_get(cache_key)
+                if cached is not None:
+                    print(f"   ⚡ Item {i}: résultat en cache")
+                    outputs = build_media_outputs(cached['video_path'], cached['audio_path'],
+                                                  key_prefix=f"{S3_PREFIX}{cache_key}", skip_if_exists=True,
+                                                  audio_options=audio_options)
+                    results[i] = {**base, 'success': True, **outputs, 'cache_hit': True}
+                    continue
+            
+            if face_future is None:
+                # Détection du visage pendant la synthèse du premier item
+                face_future = start_face_preparation(image_path, timings)
+                abort = face_abort_check(face_future)
+            
+            try:
+                print(f"   🎤 Item {i}: '{text[:40]}...'")
+                with timings.span('tts', chars=len(text)) as span:
+                    audio_path, audio_temp_dir, waveform, voice_used = text_to_speech(
+                        text, language, voice, abort, workspace
+                    )
+                    span['audio_seconds'] = len(waveform[0]) / waveform[1]
+                temp_dirs.append(audio_temp_dir)
+                if voice_used != voice:
+                    # Voix de repli: pas de cache sous la clé de la voix demandée
+                    cache_key = None
+                    base.update({'speaker': voice_used, 'voice_fallback': True})
+            except JobAborted:
+                raise
+            except Exception as tts_error:
+                results[i] = {**base, 'success': False, 'error': str(tts_error)}
+                continue
+            
+            pending.append({'index': i, 'base': base, 'audio_path': audio_path, 'waveform': waveform,
+                            'cache_key': cache_key})
+        
+        # Étape 3: Wav2Lip pour tous les items restants (batches mutualisés)
+        if pending:
+            print("3️⃣ Génération des vidéos talking head (Wav2Lip)...")
+            output_dir = make_temp_dir(workspace, 'output')
+            temp_dirs.append(output_dir)
+            output_paths = [os.path.join(output_dir, f"output_video_{p['index']}.mp4") for p in pending]
+            
+            try:
+                with timings.span('render') as span:
+                    generate_talking_head_batch(image_path, [p['audio_path'] for p in pending],
+                                                output_paths, encode_options,
+                                                [p['waveform'] for p in pending], face_future.result(),
+                                                timings)
+                    span['video_seconds'] = sum(len(p['waveform'][0]) / p['waveform'][1] for p in pending)
+                    span['frames'] = timings.value('lipsync', 'frames')
+                video_error = None
+            except Exception as e:
+                import traceback
+                print(f"   ⚠️  Erreur génération vidéo: {e}")
+                traceback.print_exc()
+                video_error = e
+            
+            for p, output_path in zip(pending, output_paths):
+                key_prefix = f"{S3_PREFIX}{p['cache_key']}" if p['cache_key'] else f"{job_prefix}/{p['index']}"
+                if video_error is None:
+                    if p['cache_key'] is not None:
+                        result_cache_put(p['cache_key'], output_path, p['audio_path'])
+                    with timings.span('outputs', log=False) as span:
+                        outputs = build_media_outputs(output_path, p['audio_path'], key_prefix,
+                                                      skip_if_exists=p['cache_key'] is not None,
+                                                      audio_options=audio_options, waveform=p['waveform'])
+                        span['bytes'] = outputs.get('video_size_bytes', 0) + outputs.get('audio_size_bytes', 0)
+                    results[p['index']] = {**p['base'], 'success': True, **outputs, 'cache_hit': False}
+                else:
+                    outputs = build_media_outputs(audio_path=p['audio_path'], key_prefix=key_prefix,
+                                                  audio_options=audio_options, waveform=p['waveform'])
+                    results[p['index']] = {
+                        **p['base'],
+                        'success': False,
+                        'error': 'Vidéo non générée (voir logs)',
+                        'error_details': str(video_error),
+                        'audio_generated': True,
+                        **outputs
+                    }
+    except JobAborted as e:
+        print(f"   ⛔ Batch interrompu avant la synthèse: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'stage': 'face_detection',
+            'items_count': len(items),
+            'timings': timings.to_dict(),
+        }
+    finally:
+        # Nettoyage
+        for temp_dir in temp_dirs:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    return {
+        'success': all(r['success'] for r in results),
+        'items': results,
+        'items_count': len(items),
+        'items_succeeded': sum(1 for r in results if r['success']),
+        'batch_size': get_batch_size() if pending else None,
+        'tts_engine': 'Coqui TTS XTTS_v2',
+        'video_engine': 'Wav2Lip GAN',
+        'cache_stats': dict(RESULT_CACHE_STATS),
+        'timings': timings.to_dict(),
+        'video_codec': 'h264',
+        'format': 'mp4'
+    }
 
 
-def handler(event):
+def handler(event, emit=None):
     """
     Handler principal pour l'API Talking Head avec Coqui TTS.
     
     Args:
+        emit: (optionnel) Fonction recevant les événements intermédiaires
+              (progression, audio, morceaux de MP4 fragmenté), voir stream_handler
         event: Événement RunPod contenant:
             - input.image: URL ou base64 de l'image
+            - input.video: (optionnel) URL ou base64 d'une vidéo pilote, à la place de l'image
+            - input.detect_every: (optionnel) Intervalle de détection du visage en mode vidéo (default: 5)
+            - input.video_preset: (optionnel) Preset x264 (default: VIDEO_PRESET)
+            - input.video_crf: (optionnel) CRF x264 (default: VIDEO_CRF)
+            - input.audio_format: (optionnel) Audio retourné: wav, pcm16, opus, mp3 ou aac (default: 'wav')
+            - input.sample_rate: (optionnel) Fréquence de l'audio retourné (default: 24000, celle de XTTS)
             - input.text: Texte à faire lire
-            - input.voice: (optionnel) Speaker ou URL audio pour clonage (default: 'Claribel Dervla')
+            - input.voice: (optionnel) Speaker, voice_id ou URL audio pour clonage (default: 'Claribel Dervla')
+            - input.operation: (optionnel) 'register_voice' pour enregistrer input.voice et obtenir un voice_id
             - input.language: (optionnel) Langue (default: 'fr')
+            - input.pipeline: (optionnel) Synthèse et lip-sync en pipeline phrase par phrase (default: False)
+            - input.cache: (optionnel) Utiliser le cache de résultats (default: True)
+            - input.items: (optionnel) Liste de {text, voice, language} pour un job batch sur input.image
     
     Returns:
-        dict: Résultat avec audio_base64 et métadonnées
+        dict: Résultat avec video_url/audio_url (si S3_BUCKET est configuré)
+              ou video_base64/audio_base64, et métadonnées (dont 'timings': spans par étape)
     """
+    timings = JobTimings(event.get('id'))
+    result = None
     try:
-        job_input = event.get('input', {})
-        
-        # Validation des entrées
-        if 'image' not in job_input:
-            return {'error': 'Le champ "image" est requis (URL ou base64)'}
-        
-        if 'text' not in job_input:
-            return {'error': 'Le champ "text" est requis'}
-        
-        image_input = job_input['image']
-        text = job_input['text']
-        language = job_input.get('language', 'fr')
-        voice = job_input.get('voice', 'Claribel Dervla')
-        
-        print(f"📥 Traitement: texte='{text[:50]}...', langue={language}, voix={voice}")
-        
-        # Étape 1: Télécharger/décoder l'image
-        print("1️⃣ Téléchargement de l'image...")
-        image_path, image_temp_dir = download_image(image_input)
-        print(f"   ✓ Image sauvegardée: {image_path}")
-        
-        # Étape 2: Générer l'audio (TTS)
-        print("2️⃣ Génération de l'audio (Coqui TTS XTTS_v2)...")
-        audio_path, audio_temp_dir = text_to_speech(text, language, voice)
-        
-        # Encoder l'audio en base64
-        with open(audio_path, 'rb') as audio_file:
-            audio_base64 = base64.b64encode(audio_file.read()).decode('utf-8')
-            audio_size = os.path.getsize(audio_path)
-        
-        print(f"   ✓ Audio encodé: {audio_size} bytes")
-        
-        # Étape 3: Générer la vidéo talking head avec Wav2Lip
-        print("3️⃣ Génération de la vidéo talking head (Wav2Lip)...")
-        output_dir = tempfile.mkdtemp()
-        output_path = os.path.join(output_dir, "output_video.mp4")
-        
-        try:
-            generate_talking_head(image_path, audio_path, output_path)
-            print(f"   ✓ Vidéo générée: {output_path}")
+        result = _run_job(event, emit, timings)
+        return result
+    finally:
+        timings.log_summary()
+        WORKER_METRICS.observe_job(timings, result)
+
+
+def _run_job(event, emit, timings):
+    """Corps de handler(): les spans du job sont enregistrés dans `timings`"""
+    try:
+        with JobWorkspace(event.get('id')) as workspace:
+            job_input = event.get('input', {})
             
-            # Encoder la vidéo en base64
-            with open(output_path, 'rb') as video_file:
-                video_base64 = base64.b64encode(video_file.read()).decode('utf-8')
-                video_size = os.path.getsize(output_path)
+            # Opération: enregistrement d'une voix clonée
+            if job_input.get('operation') == 'register_voice':
+                if 'voice' not in job_input:
+                    return {'error': 'Le champ "voice" est requis (URL, chemin ou base64 audio)'}
+                voice_id = register_voice(job_input['voice'])
+                return {
+                    'success': True,
+                    'operation': 'register_voice',
+                    'voice_id': voice_id
+                }
             
-            print(f"   ✓ Vidéo encodée: {video_size} bytes")
+            # Job batch: plusieurs textes pour une même image
+            if 'items' in job_input:
+                return handle_batch(job_input, event, workspace, timings)
             
-            # Nettoyage
-            import shutil
-            shutil.rmtree(image_temp_dir, ignore_errors=True)
-            shutil.rmtree(audio_temp_dir, ignore_errors=True)
-            shutil.rmtree(output_dir, ignore_errors=True)
-            
-            return {
-                'success': True,
-                'video_base64': video_base64,
-                'video_size_bytes': video_size,
-                'audio_base64': audio_base64,
-                'audio_size_bytes': audio_size,
-                'tts_engine': 'Coqui TTS XTTS_v2',
-                'video_engine': 'Wav2Lip GAN',
-                'speaker': voice,
-                'language': language,
-                'text_length': len(text),
-                'format': 'mp4'
+            # Validation des entrées
+            if 'image' not in job_input and 'video' not in job_input:
+                return {'error': 'Le champ "image" (ou "video") est requis (URL ou base64)'}
+            
+            if 'text' not in job_input:
+                return {'error': 'Le champ "text" est requis'}
+            
+            image_input = job_input.get('image')
+            video_input = job_input.get('video')
+            text = job_input['text']
+            language = job_input.get('language', 'fr')
+            voice = job_input.get('voice', 'Claribel Dervla')
+            pipelined = job_input.get('pipeline', False)
+            use_cache = job_input.get('cache', True)
+            detect_every = int(job_input.get('detect_every', FACE_DETECT_EVERY))
+            if detect_every < 1:
+                raise ValueError(f"detect_every doit être >= 1 (reçu: {detect_every})")
+            encode_options = {
+                'preset': job_input.get('video_preset', VIDEO_PRESET),
+                'crf': int(job_input.get('video_crf', VIDEO_CRF)),
             }
+            audio_options = parse_audio_options(job_input)
             
-        except Exception as video_error:
-            # Si erreur Wav2Lip, retourner juste l'audio
-            print(f"   ⚠️  Erreur génération vidéo: {video_error}")
-            import traceback
-            traceback.print_exc()
+            print(f"📥 Traitement: texte='{text[:50]}...', langue={language}, voix={voice}")
             
-            # Nettoyage
-            import shutil
-            shutil.rmtree(image_temp_dir, ignore_errors=True)
-            shutil.rmtree(audio_temp_dir, ignore_errors=True)
-            if os.path.exists(output_dir):
+            def notify(stage, **fields):
+                if emit is not None:
+                    emit({'event': 'progress', 'stage': stage, **fields})
+            
+            # Étape 1: Télécharger/décoder l'image (ou la vidéo pilote) et la voix de référence
+            notify('download')
+            with timings.span('download') as span:
+                if video_input:
+                    print("1️⃣ Téléchargement de la vidéo pilote...")
+                    (image_path, image_temp_dir), voice_ids = fetch_inputs(
+                        lambda: download_video(video_input, workspace), [voice]
+                    )
+                    print(f"   ✓ Vidéo sauvegardée: {image_path}")
+                    # Le pipeline phrase par phrase ne gère que les images fixes
+                    pipelined = False
+                else:
+                    print("1️⃣ Téléchargement de l'image...")
+                    (image_path, image_temp_dir), voice_ids = fetch_inputs(
+                        lambda: download_image(image_input, workspace), [voice]
+                    )
+                    print(f"   ✓ Image sauvegardée: {image_path}")
+                span['bytes'] = os.path.getsize(image_path)
+            voice = voice_ids.get(voice, voice)
+            
+            # Cache des résultats: même image + mêmes entrées → même vidéo
+            cache_key = None
+            if use_cache:
+                options = dict(encode_options)
+                if video_input:
+                    options.update({'video': True, 'detect_every': detect_every})
+                if emit is not None:
+                    # MP4 fragmenté (empty_moov): ne doit pas servir un job non streamé
+                    options['stream'] = True
+                with timings.span('cache_lookup'):
+                    cache_key = result_cache_key(image_path, text, language, voice, options)
+                    cached = result_cache_get(cache_key)
+                if cached is not None:
+                    print(f"   ⚡ Résultat en cache: {cache_key[:12]}")
+                    with timings.span('outputs') as span:
+                        outputs = build_media_outputs(
+                            cached['video_path'], cached['audio_path'],
+                            key_prefix=f"{S3_PREFIX}{cache_key}", skip_if_exists=True,
+                            audio_options=audio_options
+                        )
+                        span['bytes'] = outputs.get('video_size_bytes', 0) + outputs.get('audio_size_bytes', 0)
+                    
+                    import shutil
+                    shutil.rmtree(image_temp_dir, ignore_errors=True)
+                    
+                    return {
+                        'success': True,
+                        **outputs,
+                        'tts_engine': 'Coqui TTS XTTS_v2',
+                        'video_engine': 'Wav2Lip GAN',
+                        'speaker': voice,
+                        'language': language,
+                        'text_length': len(text),
+                        'cache_hit': True,
+                        'cache_stats': dict(RESULT_CACHE_STATS),
+                        'timings': timings.to_dict(),
+                        'video_codec': 'h264',
+                        'format': 'mp4'
+                    }
+            
+            output_dir = workspace.mkdtemp('output')
+            output_path = os.path.join(output_dir, "output_video.mp4")
+            video_done = False
+            voice_used = voice
+            waveform = None
+            
+            if emit is not None:
+                # Streaming: l'audio complet est publié avant le rendu, pas de pipeline
+                pipelined = False
+            
+            if pipelined:
+                # Étapes 2+3 en pipeline: XTTS phrase par phrase → mel → Wav2Lip
+                print("2️⃣ Génération audio + vidéo en pipeline (XTTS → Wav2Lip)...")
+                audio_temp_dir = workspace.mkdtemp('tts')
+                audio_path = os.path.join(audio_temp_dir, "speech.wav")
+                try:
+                    with timings.span('pipeline'):
+                        generate_talking_head_pipelined(image_path, text, language, voice, audio_path,
+                                                        output_path, encode_options, timings)
+                    video_done = True
+                except (PipelineRenderError, UnknownVoiceError):
+                    # Rendu commencé (TTS déjà payé) ou voix inconnue: pas de repli séquentiel
+                    raise
+                except Exception as pipeline_error:
+                    print(f"   ⚠️  Erreur pipeline, retour au mode séquentiel: {pipeline_error}")
+                    import shutil
+                    shutil.rmtree(audio_temp_dir, ignore_errors=True)
+            
+            face_future = None
+            if not video_done:
+                # Image fixe: décodage et détection du visage pendant le TTS
+                abort = None
+                if not video_input:
+                    face_future = start_face_preparation(image_path, timings)
+                    abort = face_abort_check(face_future)
+                
+                # Étape 2: Générer l'audio (TTS)
+                print("2️⃣ Génération de l'audio (Coqui TTS XTTS_v2)...")
+                notify('tts')
+                try:
+                    with timings.span('tts', chars=len(text)) as span:
+                        audio_path, audio_temp_dir, waveform, voice_used = text_to_speech(
+                            text, language, voice, abort, workspace
+                        )
+                        span['audio_seconds'] = len(waveform[0]) / waveform[1]
+                except JobAborted as e:
+                    # Aucun visage: inutile de synthétiser l'audio
+                    print(f"   ⛔ Job interrompu avant la synthèse: {e}")
+                    import shutil
+                    shutil.rmtree(image_temp_dir, ignore_errors=True)
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                    return {
+                        'success': False,
+                        'error': str(e),
+                        'stage': 'face_detection',
+                        'audio_generated': False,
+                        'speaker': voice,
+                        'language': language,
+                        'timings': timings.to_dict()
+                    }
+                workspace.check_quota('tts')
+                if voice_used != voice:
+                    # Voix de repli: ni cache ni clé de stockage de la voix demandée
+                    print(f"   ⚠️  Voix de repli {voice_used}: résultat non mis en cache")
+                    cache_key = None
+            
+            # Clé de stockage: adressée par contenu si possible, sinon par job
+            if cache_key is not None:
+                key_prefix = f"{S3_PREFIX}{cache_key}"
+            else:
+                import uuid
+                key_prefix = f"{S3_PREFIX}{event.get('id') or uuid.uuid4().hex}"
+            
+            if emit is not None:
+                # Audio disponible avant la vidéo: le client peut déjà le lire
+                expected_frames = max(1, int(len(waveform[0]) / waveform[1] * FPS))
+                emit({
+                    'event': 'audio',
+                    **build_media_outputs(audio_path=audio_path, key_prefix=key_prefix,
+                                          audio_options=audio_options, waveform=waveform),
+                    'duration_seconds': round(len(waveform[0]) / waveform[1], 3),
+                })
+                
+                # Vidéo: morceaux de MP4 fragmenté publiés au fil des batches Wav2Lip
+                chunk_sequence = [0]
+                
+                def on_fragment(data, frames_written):
+                    emit({
+                        'event': 'video_chunk',
+                        'sequence': chunk_sequence[0],
+                        'data_base64': base64.b64encode(data).decode('utf-8'),
+                        'frames_encoded': frames_written,
+                        'progress': round(min(1., frames_written / expected_frames), 3),
+                    })
+                    chunk_sequence[0] += 1
+                
+                encode_options = {**encode_options, 'on_fragment': on_fragment}
+            
+            try:
+                if not video_done:
+                    # Étape 3: Générer la vidéo talking head avec Wav2Lip
+                    print("3️⃣ Génération de la vidéo talking head (Wav2Lip)...")
+                    notify('render')
+                    with timings.span('render') as span:
+                        if video_input:
+                            generate_talking_head_video(image_path, audio_path, output_path, detect_every,
+                                                        encode_options, waveform, timings)
+                        else:
+                            generate_talking_head(image_path, audio_path, output_path, encode_options, waveform,
+                                                  face_future.result(), timings)
+                        span['video_seconds'] = len(waveform[0]) / waveform[1]
+                        # Frames réellement écrites (fps de la vidéo pilote en mode vidéo)
+                        span['frames'] = timings.value('lipsync', 'frames')
+                print(f"   ✓ Vidéo générée: {output_path}")
+                workspace.check_quota('render')
+                
+                if cache_key is not None:
+                    with timings.span('cache_put'):
+                        result_cache_put(cache_key, output_path, audio_path)
+                
+                # Upload (URLs) ou encodage base64 de la vidéo et de l'audio
+                notify('upload')
+                with timings.span('outputs') as span:
+                    outputs = build_media_outputs(output_path, audio_path, key_prefix,
+                                                  skip_if_exists=cache_key is not None or emit is not None,
+                                                  audio_options=audio_options, waveform=waveform)
+                    span['bytes'] = outputs.get('video_size_bytes', 0) + outputs.get('audio_size_bytes', 0)
+                
+                # Nettoyage
+                import shutil
+                shutil.rmtree(image_temp_dir, ignore_errors=True)
+                shutil.rmtree(audio_temp_dir, ignore_errors=True)
                 shutil.rmtree(output_dir, ignore_errors=True)
+                
+                return {
+                    'success': True,
+                    **outputs,
+                    'tts_engine': 'Coqui TTS XTTS_v2',
+                    'video_engine': 'Wav2Lip GAN',
+                    'wav2lip_backend': WAV2LIP_MODEL['backend'],
+                    'speaker': voice_used,
+                    'voice_fallback': voice_used != voice,
+                    'language': language,
+                    'text_length': len(text),
+                    'pipeline': video_done and pipelined,
+                    'batch_size': get_batch_size(),
+                    'cache_hit': False,
+                    'cache_stats': dict(RESULT_CACHE_STATS),
+                    'workspace_peak_bytes': workspace.peak_bytes,
+                    'workspace_stats': workspace_disk_usage(),
+                    'timings': timings.to_dict(),
+                    'video_codec': 'h264',
+                    'format': 'mp4'
+                }
+                
+            except Exception as video_error:
+                # Si erreur Wav2Lip, retourner juste l'audio
+                print(f"   ⚠️  Erreur génération vidéo: {video_error}")
+                import traceback
+                traceback.print_exc()
+                
+                outputs = build_media_outputs(audio_path=audio_path, key_prefix=key_prefix,
+                                              audio_options=audio_options, waveform=waveform)
+                
+                # Nettoyage
+                import shutil
+                shutil.rmtree(image_temp_dir, ignore_errors=True)
+                shutil.rmtree(audio_temp_dir, ignore_errors=True)
+                if os.path.exists(output_dir):
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                
+                return {
+                    'success': False,
+                    'error': 'Vidéo non générée (voir logs)',
+                    'error_details': str(video_error),
+                    'audio_generated': True,
+                    **outputs,
+                    'tts_engine': 'Coqui TTS XTTS_v2',
+                    'speaker': voice_used,
+                    'voice_fallback': voice_used != voice,
+                    'language': language,
+                    'timings': timings.to_dict()
+                }
             
-            return {
-                'success': False,
-                'error': 'Vidéo non générée (voir logs)',
-                'error_details': str(video_error),
-                'audio_generated': True,
-                'audio_base64': audio_base64,
-                'audio_size_bytes': audio_size,
-                'tts_engine': 'Coqui TTS XTTS_v2',
-                'speaker': voice,
-                'language': language
-            }
-        
     except Exception as e:
         import traceback
         print(f"❌ ERREUR: {e}")
@@ -580,14 +4387,128 @@ def handler(event):
         return {
             'error': str(e),
             'type': type(e).__name__,
-            'traceback': traceback.format_exc()
+            'traceback': traceback.format_exc(),
+            'timings': timings.to_dict()
         }
 
 
+def _stream_events(event):
+    """Exécute handler() dans un thread et retourne la file de ses événements"""
+    import queue
+    
+    events = queue.Queue()
+    streamed = []
+    
+    def emit(item):
+        if item.get('event') == 'video_chunk':
+            streamed.append(True)
+        events.put(item)
+    
+    def run():
+        result = handler(event, emit=emit)
+        if streamed and 'video_base64' in result:
+            # La vidéo complète est la concaténation des morceaux déjà envoyés
+            result.pop('video_base64')
+            result['video_streamed'] = True
+        events.put({'event': 'result', **result})
+        events.put(None)
+    
+    threading.Thread(target=run, daemon=True).start()
+    return events
+
+
+def stream_handler(event):
+    """
+    Variante streaming du handler (générateur, return_aggregate_stream).
+    
+    Événements produits, dans l'ordre:
+        - {'event': 'progress', 'stage': 'download' | 'tts' | 'render' | 'upload'}
+        - {'event': 'audio', audio_url ou audio_base64, duration_seconds}: dès la fin du TTS
+        - {'event': 'video_chunk', sequence, data_base64, frames_encoded, progress}:
+          morceaux d'un MP4 fragmenté, lisible au fil de l'eau (MSE) une fois concaténés
+        - {'event': 'result', ...}: résultat final du handler (sans video_base64 si streamée)
+    """
+    events = _stream_events(event)
+    while True:
+        item = events.get()
+        if item is None:
+            return
+        yield item
+
+
+async def async_stream_handler(event):
+    """Point d'entrée asynchrone RunPod pour stream_handler"""
+    import asyncio
+    
+    events = _stream_events(event)
+    while True:
+        item = await asyncio.to_thread(events.get)
+        if item is None:
+            return
+        yield item
+
+
+async def async_handler(event):
+    """
+    Point d'entrée asynchrone RunPod: exécute handler() dans un thread.
+    
+    Plusieurs jobs avancent ainsi en parallèle (téléchargement, encodage,
+    upload); les appels aux modèles sont sérialisés par MODEL_SCHEDULER.
+    """
+    import asyncio
+    
+    return await asyncio.to_thread(handler, event)
+
+
+def concurrency_modifier(current_concurrency):
+    """Nombre de jobs que le worker accepte simultanément"""
+    return MAX_CONCURRENT_JOBS
+
+
 if __name__ == "__main__":
+    # Calibration hors ligne de la taille de batch: python handler.py --calibrate
+    if '--calibrate' in sys.argv:
+        calibrate_batch_size()
+        sys.exit(0)
+    
+    # Export du graphe ONNX dans le store: python handler.py --export-onnx
+    if '--export-onnx' in sys.argv:
+        export_wav2lip_onnx(init_wav2lip_model()['eager_model'])
+        sys.exit(0)
+    
+    # Comparaison des backends d'inférence: python handler.py --benchmark-backends
+    if '--benchmark-backends' in sys.argv:
+        benchmark_backends()
+        sys.exit(0)
+    
     # Mode développement: test local
     print("🚀 Démarrage du worker RunPod - Talking Head API (Coqui TTS)")
     print("=" * 60)
     
+    # Espaces de travail laissés par un worker précédent
+    print(f"📁 Espaces de travail: {WORKSPACE_ROOT}")
+    sweep_orphan_workspaces()
+    
+    # Préchauffer les modèles avant d'accepter des jobs (WARMUP_ON_BOOT=1)
+    if WARMUP_ON_BOOT:
+        warmup_models()
+        get_batch_size()
+    
+    # Métriques internes pour un scraper local (METRICS_PORT / METRICS_FILE)
+    start_metrics_exporter()
+    
     # Démarrer le worker
-    runpod.serverless.start({"handler": handler})
+    print(f"🔀 Jobs concurrents par worker: {MAX_CONCURRENT_JOBS}")
+    if STREAM_OUTPUT:
+        # Endpoint /stream: audio puis vidéo fragmentée publiés au fil du rendu
+        print("📡 Sortie en streaming (return_aggregate_stream)")
+        runpod.serverless.start({
+            "handler": async_stream_handler,
+            "concurrency_modifier": concurrency_modifier,
+            "return_aggregate_stream": True,
+        })
+    else:
+        runpod.serverless.start({
+            "handler": async_handler,
+            "concurrency_modifier": concurrency_modifier,
+        })
@@ -0,0 +1,183 @@
+"""
+Test de la couche de téléchargement des entrées
+===============================================
+Vérifie fetch_url / download_media contre un serveur HTTP local:
+taille bornée, retries avec backoff, timeouts et téléchargements parallèles.
+
+    python test_fetch.py
+"""
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import handler
+
+PAYLOAD = os.urandom(300 * 1024)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serveur de test: contenu, erreurs transitoires, réponses lentes"""
+    
+    failures = {}
+    lock = threading.Lock()
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_GET(self):
+        if self.path.startswith('/flaky'):
+            # Échoue deux fois (503) avant de répondre
+            with self.lock:
+                count = self.failures.get(self.path, 0)
+                self.failures[self.path] = count + 1
+            if count < 2:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        if self.path.startswith('/slow'):
+            time.sleep(0.5)
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        if self.path.startswith('/chunked'):
+            # Sans Content-Length: la limite doit être vérifiée en cours de lecture
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i in range(0, len(PAYLOAD), 64 * 1024):
+                block = PAYLOAD[i:i + 64 * 1024]
+                self.wfile.write(f"{len(block):x}\r\n".encode() + block + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self.send_header('Content-Length', str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+
+def _start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _reset_session(**settings):
+    """Reconstruit la session partagée avec d'autres réglages"""
+    for name, value in settings.items():
+        setattr(handler, name, value)
+    handler.HTTP_SESSION = None
+
+
+def test_fetch_content(base_url):
+    """Le contenu est téléchargé en streaming, en mémoire ou dans un fichier"""
+    print("\n=== Test: Téléchargement ===")
+    _reset_session()
+    assert handler.fetch_url(f"{base_url}/image.png") == PAYLOAD
+    
+    path, temp_dir = handler.download_image(f"{base_url}/image.png")
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    print("✓ Test réussi")
+
+
+def test_fetch_max_bytes(base_url):
+    """Un fichier trop gros est refusé, avec ou sans Content-Length"""
+    print("\n=== Test: Taille maximale ===")
+    _reset_session()
+    for path in ('/image.png', '/chunked'):
+        try:
+            handler.fetch_url(f"{base_url}{path}", max_bytes=100 * 1024)
+        except ValueError as e:
+            print(f"   refusé ({path}): {e}")
+        else:
+            raise AssertionError(f"{path}: la limite de taille n'a pas été appliquée")
+    assert handler.fetch_url(f"{base_url}/chunked", max_bytes=len(PAYLOAD)) == PAYLOAD
+    print("✓ Test réussi")
+
+
+def test_fetch_retries(base_url):
+    """Les erreurs 503 transitoires sont retentées avec backoff"""
+    print("\n=== Test: Retries ===")
+    _reset_session(FETCH_RETRIES=3, FETCH_BACKOFF=0.01)
+    assert handler.fetch_url(f"{base_url}/flaky/1") == PAYLOAD
+    assert StandInHandler.failures['/flaky/1'] == 3
+    
+    _reset_session(FETCH_RETRIES=1, FETCH_BACKOFF=0.01)
+    try:
+        handler.fetch_url(f"{base_url}/flaky/2")
+    except requests.HTTPError as e:
+        print(f"   abandon après 1 retry: {e}")
+    else:
+        raise AssertionError("503 persistant accepté")
+    
+    try:
+        handler.fetch_url(f"{base_url}/missing")
+    except requests.HTTPError as e:
+        print(f"   404 non retentée: {e}")
+    else:
+        raise AssertionError("404 acceptée")
+    print("✓ Test réussi")
+
+
+def test_fetch_timeout(base_url):
+    """Une réponse plus lente que le timeout de lecture échoue"""
+    print("\n=== Test: Timeout ===")
+    _reset_session(FETCH_RETRIES=0, FETCH_READ_TIMEOUT=0.1)
+    try:
+        handler.fetch_url(f"{base_url}/slow")
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        print(f"   timeout: {type(e).__name__}")
+    else:
+        raise AssertionError("timeout non appliqué")
+    _reset_session(FETCH_RETRIES=3, FETCH_READ_TIMEOUT=30.)
+    print("✓ Test réussi")
+
+
+def test_fetch_inputs_parallel(base_url):
+    """Image et voix de référence sont téléchargées en parallèle"""
+    print("\n=== Test: Téléchargements parallèles ===")
+    _reset_session()
+    original_register = handler.register_voice
+    handler.register_voice = lambda voice, temp_dir=None: (
+        handler.fetch_url(voice) and 'voice_test'
+    )
+    try:
+        start = time.time()
+        (path, temp_dir), voice_ids = handler.fetch_inputs(
+            lambda: handler.download_image(f"{base_url}/slow/image.png"),
+            ['Claribel Dervla', f"{base_url}/slow/voice.wav"]
+        )
+        elapsed = time.time() - start
+    finally:
+        handler.register_voice = original_register
+    
+    assert voice_ids == {f"{base_url}/slow/voice.wav": 'voice_test'}
+    assert os.path.getsize(path) == len(PAYLOAD)
+    print(f"   2 requêtes lentes (0.5 s) en {elapsed:.2f} s")
+    assert elapsed < 0.9, "Les téléchargements n'ont pas été parallélisés"
+    print("✓ Test réussi")
+
+
+if __name__ == "__main__":
+    print("🚀 Tests de la couche de téléchargement")
+    print("=" * 60)
+    
+    server, base_url = _start_server()
+    try:
+        test_fetch_content(base_url)
+        test_fetch_max_bytes(base_url)
+        test_fetch_retries(base_url)
+        test_fetch_timeout(base_url)
+        test_fetch_inputs_parallel(base_url)
+    finally:
+        server.shutdown()
+    
+    print("\n" + "=" * 60)
+    print("✅ Tous les tests sont passés!")
@@ -0,0 +1,101 @@
+"""
+Test de l'export des métriques du worker
+========================================
+Alimente WORKER_METRICS avec des spans de jobs synthétiques, puis vérifie
+l'exposition Prometheus servie en HTTP local et écrite dans un fichier.
+
+    python test_metrics.py
+"""
+
+import os
+import socket
+import tempfile
+import time
+import urllib.request
+
+import handler
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _job_timings(tts_seconds, render_seconds, audio_seconds):
+    timings = handler.JobTimings('test', log=False)
+    timings.record('tts', tts_seconds, tts_seconds, audio_seconds=audio_seconds)
+    timings.record('render', render_seconds, render_seconds, video_seconds=audio_seconds,
+                   frames=round(audio_seconds * handler.FPS))
+    return timings
+
+
+def _parse(text):
+    """Échantillons {'nom{labels}': valeur} d'une exposition texte"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_render():
+    """Histogrammes, compteurs, RTF et état du worker sont exposés"""
+    print("\n=== Test: Exposition Prometheus ===")
+    metrics = handler.WorkerMetrics(window=60)
+    metrics.observe_job(_job_timings(2.0, 3.0, 4.0), {'success': True})
+    metrics.observe_job(_job_timings(1.0, 1.0, 2.0), {'success': True})
+    metrics.observe_job(handler.JobTimings('test', log=False), {'error': 'boom'})
+    
+    samples = _parse(metrics.render())
+    assert samples['talking_head_jobs_total{status="success"}'] == 2
+    assert samples['talking_head_jobs_total{status="error"}'] == 1
+    assert samples['talking_head_stage_seconds_count{stage="tts"}'] == 2
+    assert samples['talking_head_stage_seconds_bucket{stage="render",le="2.5"}'] == 1
+    assert samples['talking_head_stage_seconds_bucket{stage="render",le="+Inf"}'] == 2
+    assert samples['talking_head_frames_total'] == 6 * handler.FPS
+    assert samples['talking_head_tts_rtf'] == 0.5
+    assert samples['talking_head_jobs_per_second'] > 0
+    assert samples['talking_head_rss_bytes'] > 0
+    assert samples['talking_head_peak_rss_bytes'] >= samples['talking_head_rss_bytes']
+    assert 'talking_head_cache_hit_ratio{cache="result"}' in samples
+    print(f"   {len(samples)} échantillons")
+    print("✓ Test réussi")
+
+
+def test_metrics_exporter():
+    """Un scraper local lit les mêmes métriques en HTTP et dans le fichier"""
+    print("\n=== Test: Exporteur HTTP et fichier ===")
+    handler.WORKER_METRICS.observe_job(_job_timings(1.0, 2.0, 3.0), {'success': True})
+    work_dir = tempfile.mkdtemp()
+    path = os.path.join(work_dir, 'metrics.prom')
+    port = _free_port()
+    
+    server = handler.start_metrics_exporter(port=port, path=path, interval=0.1)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            scraped = _parse(response.read().decode())
+        assert scraped['talking_head_jobs_total{status="success"}'] >= 1
+        
+        deadline = time.time() + 2
+        while not os.path.exists(path) and time.time() < deadline:
+            time.sleep(0.05)
+        with open(path) as f:
+            flushed = _parse(f.read())
+        assert flushed['talking_head_frames_total'] == scraped['talking_head_frames_total']
+    finally:
+        server.shutdown()
+    print("✓ Test réussi")
+
+
+if __name__ == "__main__":
+    print("🚀 Tests des métriques du worker")
+    print("=" * 60)
+    
+    test_metrics_render()
+    test_metrics_exporter()
+    
+    print("\n" + "=" * 60)
+    print("✅ Tous les tests sont passés!")
@@ -0,0 +1,92 @@
+"""
+Test de parité ONNX Runtime / PyTorch pour Wav2Lip
+==================================================
+Exporte Wav2Lip en ONNX puis compare les sorties d'onnxruntime à celles du
+modèle torch, pour plusieurs tailles de batch (dimension dynamique).
+Utilise le checkpoint du store s'il est présent, sinon des poids aléatoires.
+
+    pip install onnxruntime
+    python test_onnx_export.py
+"""
+
+import os
+import shutil
+import tempfile
+
+import torch
+
+import handler
+
+ATOL = 1e-4
+
+
+def _build_model():
+    """Wav2Lip eager: checkpoint du worker si disponible, sinon poids aléatoires"""
+    try:
+        return handler.init_wav2lip_model()['eager_model']
+    except Exception as e:
+        print(f"   ⚠️  Checkpoint indisponible ({e}), poids aléatoires")
+        import sys
+        sys.path.append('/app/Wav2Lip')
+        from models import Wav2Lip as Wav2LipModel
+        torch.manual_seed(0)
+        return Wav2LipModel().eval()
+
+
+def _max_diff(onnx_model, model, batch_size, seed):
+    mel, face = handler.wav2lip_example_inputs(batch_size, seed=seed)
+    with torch.no_grad():
+        expected = model(mel, face)
+    actual = onnx_model(mel, face)
+    assert actual.shape == expected.shape, f"{actual.shape} != {expected.shape}"
+    return (actual - expected).abs().max().item()
+
+
+def test_onnx_parity():
+    """Les sorties ONNX Runtime égalent celles de torch, quel que soit le batch"""
+    print("\n=== Test: Parité ONNX / torch ===")
+    model = _build_model().to('cpu')
+    work_dir = tempfile.mkdtemp()
+    try:
+        onnx_path = handler.export_wav2lip_onnx(model, os.path.join(work_dir, 'wav2lip.onnx'))
+        onnx_model = handler.OnnxWav2Lip(onnx_path)
+        
+        for seed, batch_size in enumerate((1, 7, 32)):
+            diff = _max_diff(onnx_model, model, batch_size, seed)
+            print(f"   batch {batch_size}: écart max {diff:.2e}")
+            assert diff < ATOL, f"Écart {diff} > {ATOL} (batch {batch_size})"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print("✓ Test réussi")
+
+
+def test_onnx_backend_selection():
+    """Le backend 'auto' sert l'artefact ONNX s'il existe, eager sinon"""
+    print("\n=== Test: Sélection du backend ===")
+    model = _build_model().to('cpu')
+    work_dir = tempfile.mkdtemp()
+    original_path = handler.WAV2LIP_ONNX_PATH
+    try:
+        handler.WAV2LIP_ONNX_PATH = os.path.join(work_dir, 'wav2lip.onnx')
+        _, backend = handler.build_inference_backend(model, 'cpu', 'auto')
+        assert backend == 'eager', backend
+        
+        handler.export_wav2lip_onnx(model)
+        served, backend = handler.build_inference_backend(model, 'cpu', 'auto')
+        assert backend == 'onnx', backend
+        assert isinstance(served, handler.OnnxWav2Lip)
+    finally:
+        handler.WAV2LIP_ONNX_PATH = original_path
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print("✓ Test réussi")
+
+
+if __name__ == "__main__":
+    print("🚀 Tests de l'export ONNX Wav2Lip")
+    print("=" * 60)
+    
+    test_onnx_parity()
+    test_onnx_backend_selection()
+    
+    print("\n" + "=" * 60)
+    print("✅ Tous les tests sont passés!")
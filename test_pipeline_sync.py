@@ -0,0 +1,80 @@
+"""
+Test de la synchronisation audio / vidéo du pipeline phrase par phrase
+======================================================================
+Le nombre de frames doit égaler la durée de l'audio × FPS: pour un clip
+unique comme pour le pipeline phrase par phrase, sans dérive.
+
+    python test_pipeline_sync.py
+"""
+
+import numpy as np
+
+import handler
+
+SAMPLE_RATE = 24000
+# Durées de phrases (secondes) non multiples de la durée d'une frame
+SENTENCE_SECONDS = [5.0, 3.37, 1.1, 2.93, 0.41, 4.26, 2.0, 1.77, 3.5, 0.9]
+
+
+def _sentences():
+    rng = np.random.default_rng(0)
+    return [
+        ((0.1 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32), SAMPLE_RATE)
+        for seconds in SENTENCE_SECONDS
+    ]
+
+
+def test_align_mel_chunks():
+    """Fenêtres complétées (dernière répétée) ou tronquées au nombre voulu"""
+    print("\n=== Test: Ajustement des mel chunks ===")
+    chunks = np.arange(3 * 80 * 16, dtype=np.float32).reshape(3, 80, 16)
+    padded = handler.align_mel_chunks(chunks, 5)
+    assert padded.shape == (5, 80, 16)
+    assert np.array_equal(padded[3], chunks[-1]) and np.array_equal(padded[4], chunks[-1])
+    assert handler.align_mel_chunks(chunks, 2).shape == (2, 80, 16)
+    assert handler.align_mel_chunks(chunks, 0).shape == (0, 80, 16)
+    print("✓ Test réussi")
+
+
+def test_single_clip_frames_match_audio():
+    """Hors pipeline: la vidéo couvre tout l'audio (rien de coupé par -shortest)"""
+    print("\n=== Test: Frames d'un clip unique ===")
+    for wav, sample_rate in _sentences():
+        expected = handler.audio_frame_count(waveform=(wav, sample_rate))
+        assert expected == max(1, round(len(wav) / sample_rate * handler.FPS))
+        mel_chunks = handler.get_mel_chunks(handler.audio_to_mel(waveform=(wav, sample_rate)))
+        assert len(handler.align_mel_chunks(mel_chunks, expected)) == expected
+        print(f"   {len(wav) / sample_rate:.2f} s: {len(mel_chunks)} → {expected} frames")
+    print("✓ Test réussi")
+
+
+def test_pipeline_frames_match_audio():
+    """Frames totales = durée audio × FPS, fin de chaque phrase sur la timeline"""
+    print("\n=== Test: Frames du pipeline multi-phrases ===")
+    sentences = _sentences()
+    
+    naive = sum(len(handler.get_mel_chunks(handler.audio_to_mel(waveform=w))) for w in sentences)
+    
+    frames = 0
+    samples = 0
+    for (wav, sample_rate), mel_chunks in zip(sentences, handler.timeline_mel_chunks(sentences)):
+        samples += len(wav)
+        frames += len(mel_chunks)
+        assert frames == round(samples / sample_rate * handler.FPS), f"{frames} frames après {samples} échantillons"
+    
+    expected = round(samples / SAMPLE_RATE * handler.FPS)
+    print(f"   {len(sentences)} phrases: {frames} frames (attendu {expected}, sans calage {naive})")
+    assert frames == expected
+    print("✓ Test réussi")
+
+
+if __name__ == "__main__":
+    print("🚀 Tests de synchronisation du pipeline")
+    print("=" * 60)
+    
+    test_align_mel_chunks()
+    test_single_clip_frames_match_audio()
+    test_pipeline_frames_match_audio()
+    
+    print("\n" + "=" * 60)
+    print("✅ Tous les tests sont passés!")
@@ -0,0 +1,135 @@
+"""
+Test de l'upload vers le stockage objet (S3) avec moto
+======================================================
+Vérifie l'upload multipart, les URLs présignées et les réponses du handler
+sans bucket réel. Pour tester contre MinIO, définir S3_ENDPOINT_URL et
+S3_BUCKET puis lancer upload_to_storage directement.
+
+    pip install "moto[s3]>=5" boto3
+    python test_storage.py
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import boto3
+import requests
+from moto import mock_aws
+
+import handler
+
+BUCKET = 'talking-head-test'
+
+
+def _use_bucket():
+    """Configure le handler pour utiliser le bucket moto"""
+    handler.S3_BUCKET = BUCKET
+    handler.S3_ENDPOINT_URL = None
+    handler.S3_REGION = 'us-east-1'
+    handler.S3_CLIENT = None
+    handler.S3_MULTIPART_CHUNK_MB = 5  # minimum S3 pour une part
+    boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=BUCKET)
+
+
+def _make_file(size, suffix):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(size))
+    return path
+
+
+@mock_aws
+def test_multipart_upload():
+    """Un fichier > chunk est uploadé en multipart et récupérable via l'URL présignée"""
+    print("\n=== Test: Upload multipart ===")
+    _use_bucket()
+    path = _make_file(12 * 1024 * 1024, '.mp4')
+    
+    url = handler.upload_to_storage(path, key='tests/video.mp4', content_type='video/mp4')
+    print(f"URL: {url[:80]}...")
+    
+    head = boto3.client('s3', region_name='us-east-1').head_object(Bucket=BUCKET, Key='tests/video.mp4')
+    assert head['ContentLength'] == os.path.getsize(path)
+    assert head['ContentType'] == 'video/mp4'
+    # ETag multipart: "<md5>-<nombre de parts>"
+    assert '-' in head['ETag']
+    
+    response = requests.get(url)
+    assert response.status_code == 200
+    with open(path, 'rb') as f:
+        assert response.content == f.read()
+    
+    os.remove(path)
+    print("✓ Test réussi")
+
+
+@mock_aws
+def test_skip_if_exists():
+    """Une clé adressée par contenu déjà présente n'est pas réuploadée"""
+    print("\n=== Test: Clé existante ===")
+    _use_bucket()
+    path = _make_file(1024, '.wav')
+    
+    handler.upload_to_storage(path, key='tests/speech.wav')
+    s3 = boto3.client('s3', region_name='us-east-1')
+    first = s3.head_object(Bucket=BUCKET, Key='tests/speech.wav')['LastModified']
+    
+    url = handler.upload_to_storage(path, key='tests/speech.wav', skip_if_exists=True)
+    assert url.startswith('https://')
+    assert s3.head_object(Bucket=BUCKET, Key='tests/speech.wav')['LastModified'] == first
+    
+    os.remove(path)
+    print("✓ Test réussi")
+
+
+@mock_aws
+def test_build_media_outputs_urls():
+    """Avec un bucket, la réponse contient des URLs et pas de base64"""
+    print("\n=== Test: Réponse avec URLs ===")
+    _use_bucket()
+    video_path = _make_file(2048, '.mp4')
+    audio_path = _make_file(1024, '.wav')
+    
+    outputs = handler.build_media_outputs(video_path, audio_path, key_prefix='tests/job-1')
+    print(f"Champs: {sorted(outputs)}")
+    
+    assert 'video_url' in outputs and 'audio_url' in outputs
+    assert 'video_base64' not in outputs and 'audio_base64' not in outputs
+    assert outputs['video_size_bytes'] == 2048
+    assert outputs['audio_size_bytes'] == 1024
+    
+    os.remove(video_path)
+    os.remove(audio_path)
+    print("✓ Test réussi")
+
+
+def test_build_media_outputs_base64():
+    """Sans bucket, la réponse reste en base64"""
+    print("\n=== Test: Réponse base64 (sans bucket) ===")
+    handler.S3_BUCKET = None
+    audio_path = _make_file(1024, '.wav')
+    
+    outputs = handler.build_media_outputs(audio_path=audio_path)
+    
+    assert 'audio_base64' in outputs
+    assert 'audio_url' not in outputs
+    
+    os.remove(audio_path)
+    print("✓ Test réussi")
+
+
+if __name__ == "__main__":
+    print("🚀 Tests du stockage S3 (moto)")
+    print("=" * 60)
+    
+    test_multipart_upload()
+    test_skip_if_exists()
+    test_build_media_outputs_urls()
+    test_build_media_outputs_base64()
+    
+    print("\n" + "=" * 60)
+    print("✅ Tous les tests sont passés!")